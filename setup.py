@@ -65,6 +65,7 @@ setup(
     install_requires=['PyQt5;platform_system=="Darwin"',   # it's better to use distro-supplied
                       'PyQt5;platform_system=="Windows"',  # PyQt package on Linux
                       'QtPy', 'paho-mqtt'],
+    extras_require={'zstd': ['zstandard']},  # экспорт в .zst
 
     classifiers=[
         "Development Status :: 4 - Beta",
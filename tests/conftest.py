@@ -0,0 +1,7 @@
+import pytest
+from qtpy.QtCore import QCoreApplication
+
+
+@pytest.fixture(scope='session')
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
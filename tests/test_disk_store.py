@@ -0,0 +1,116 @@
+import os
+
+import pytest
+
+from vqttt.capture import RECORD, CaptureFormatError, CaptureWriter, iter_records
+from vqttt.disk_store import INDEX_ENTRY, CaptureStore, DiskStore
+
+
+def make_records(count):
+    # qos 0..2 без retain: флаги совпадают с qos
+    return [('sensors/{}/temp'.format(i % 7), 1000.0 + i, i % 3, i, b'value %d' % i) for i in range(count)]
+
+
+def stored(store):
+    return [(store.topic(row), store.timestamp(row), store.qos(row), store.mid(row), bytes(store.payload(row)))
+            for row in range(len(store))]
+
+
+def open_store(directory):
+    store = DiskStore(directory)
+    assert store.load()
+    return store
+
+
+def test_disk_store_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(DiskStore, 'segment_size', 4096)
+    records = make_records(500)
+    store = open_store(str(tmp_path))
+    store.extend_records(records)
+    assert len(store.segments) > 1
+    assert stored(store) == records
+    store.close()
+
+    store = open_store(str(tmp_path))
+    assert stored(store) == records
+    assert sorted(store.topic_rows[store.topic_ids['sensors/3/temp']]) == list(range(3, 500, 7))
+    store.append_record('new', 1.0, 0, 0, b'z')
+    assert store.payload(len(store) - 1) == b'z'
+    assert list(store.topic_rows[store.topic_ids['new']]) == [500]
+    store.close()
+
+
+def test_disk_store_evict_drops_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(DiskStore, 'segment_size', 4096)
+    store = open_store(str(tmp_path))
+    store.extend_records(make_records(500))
+    files = len(os.listdir(str(tmp_path)))
+    count = store.rows_for_bytes(1)
+    assert count == store.segments[0].count
+    store.evict(count)
+    assert len(os.listdir(str(tmp_path))) == files - 2
+    assert store.first_seq == count
+    assert all(seq >= count for seqs in store.topic_rows.values() for seq in seqs)
+    store.close()
+
+    store = open_store(str(tmp_path))
+    assert store.first_seq == count
+    assert len(store) == 500 - count
+    store.close()
+
+
+def test_capture_round_trip(tmp_path):
+    path = str(tmp_path / 'traffic.vqcap')
+    records = make_records(300)
+    writer = CaptureWriter(path)
+    writer.write_batch(records[:100])
+    writer.write_batch(records[100:])
+    writer.close()
+    assert list(iter_records(path)) == records
+
+    store = CaptureStore(path)
+    assert store.load()
+    assert stored(store) == records
+    store.close()
+    assert os.path.exists(path + '.vqidx')
+
+    # Дописанная запись: кэш индекса продолжается
+    with open(path, 'ab') as file:
+        file.write(RECORD.pack(RECORD.size + 8, 5000.0, 1, 7, 4) + b'latetail')
+    store = CaptureStore(path)
+    assert store.load()
+    assert len(store) == 301
+    assert store.topic(300) == 'late' and store.payload(300) == b'tail'
+    assert list(store.topic_rows[store.topic_ids['late']]) == [300]
+    store.close()
+
+
+def test_capture_rejects_foreign_file(tmp_path):
+    path = tmp_path / 'other.vqcap'
+    path.write_bytes(b'not a capture')
+    with pytest.raises(CaptureFormatError):
+        CaptureStore(str(path))
+
+
+def test_index_grows_on_demand(tmp_path, monkeypatch):
+    monkeypatch.setattr(DiskStore, 'segment_size', 1 << 20)
+    store = open_store(str(tmp_path))
+    store.append_record('a', 1.0, 0, 0, b'x')
+    segment = store.segments[0]
+    assert os.path.getsize(segment.index_path) == (1 << 20) // segment.index_record_size * INDEX_ENTRY.size
+    store.extend_records(make_records(5000))
+    assert len(store.segments) == 1
+    assert os.path.getsize(segment.index_path) > 5001 * INDEX_ENTRY.size
+    assert store.payload(len(store) - 1) == b'value 4999'
+    # Индекс занимает диск наравне с данными
+    assert store.payload_bytes == segment.data_end + os.path.getsize(segment.index_path)
+    store.close()
+    store = open_store(str(tmp_path))
+    assert len(store) == 5001
+    assert store.payload_bytes == sum(os.path.getsize(str(path)) for path in tmp_path.iterdir()
+                                      if path.suffix in ('.vqcap', '.vqidx'))
+    store.close()
+
+
+def test_close_without_load(tmp_path):
+    DiskStore(str(tmp_path)).close()
@@ -0,0 +1,74 @@
+import csv
+import gzip
+import json
+
+import pytest
+
+from vqttt.exporter import ExportError, Exporter, export_format
+from vqttt.message_store import MessageStore, message_flags
+
+ROWS = [('a/b', 1.5, 1, False, 10, b'hello'),
+        ('a/c', 2.5, 0, True, 11, b'\xff\x00'),
+        ('a/b', 3.5, 2, False, 12, 'привет, "мир"'.encode('utf-8'))]
+
+
+@pytest.fixture
+def store():
+    store = MessageStore()
+    for topic, timestamp, qos, retain, mid, payload in ROWS:
+        store.append_record(topic, timestamp, message_flags(qos, retain), mid, payload)
+    return store
+
+
+def export(app, store, path, seqs=None):
+    exporter = Exporter()
+    result = []
+    exporter.finished.connect(lambda written, error: result.append((written, error)))
+    exporter.start(store, range(len(store)) if seqs is None else seqs, str(path))
+    exporter.pool.waitForDone()
+    app.processEvents()
+    return result
+
+
+def test_export_format():
+    assert export_format('x.ndjson') == ('ndjson', None)
+    assert export_format('X.JSONL.GZ') == ('ndjson', 'gz')
+    assert export_format('x.csv.zst') == ('csv', 'zst')
+    with pytest.raises(ExportError):
+        export_format('x.txt')
+
+
+def test_ndjson(app, store, tmp_path):
+    path = tmp_path / 'out.ndjson.gz'
+    assert export(app, store, path) == [(3, '')]
+    with gzip.open(str(path), 'rt', encoding='utf-8') as file:
+        records = [json.loads(line) for line in file]
+    assert records[0] == {'time': 1.5, 'topic': 'a/b', 'qos': 1, 'retain': False, 'mid': 10, 'payload': 'hello'}
+    assert records[1]['encoding'] == 'base64' and records[1]['payload'] == '/wA='
+    assert records[2]['payload'] == 'привет, "мир"'
+
+
+def test_csv_visible_rows(app, store, tmp_path):
+    path = tmp_path / 'out.csv'
+    assert export(app, store, path, [0, 2]) == [(2, '')]
+    with open(str(path), newline='', encoding='utf-8') as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ['time', 'topic', 'qos', 'retain', 'mid', 'payload', 'encoding']
+    assert rows[1] == ['1.5', 'a/b', '1', '0', '10', 'hello', 'utf-8']
+    assert rows[2][5] == 'привет, "мир"'
+    assert len(rows) == 3
+
+
+def test_error_is_reported(app, store, tmp_path):
+    assert export(app, store, tmp_path / 'out.txt')[0][1].startswith('Неизвестный формат')
+    assert export(app, store, tmp_path / 'missing' / 'out.csv')[0][0] == 0
+
+
+def test_unexpected_error_is_reported(app, tmp_path):
+    class BrokenStore(MessageStore):
+        def payload(self, row):
+            raise KeyError(row)
+
+    broken = BrokenStore()
+    broken.append_record('a', 1.0, 0, 0, b'x')
+    assert export(app, broken, tmp_path / 'out.csv') == [(0, '0')]
@@ -0,0 +1,37 @@
+import sys
+import tracemalloc
+
+from vqttt.message import Message
+
+# Сколько байт на Message допустимо сверх самого payload (объект, bytes, время, mid)
+BYTES_PER_MESSAGE = 160
+
+
+def test_no_instance_dict():
+    msg = Message('a/b', b'x')
+    assert not hasattr(msg, '__dict__')
+    assert sys.getsizeof(msg) < 128
+
+
+def test_payload_is_decoded_lazily():
+    msg = Message('a/b', b'\xff\x00')
+    assert msg._payload is None
+    assert msg.payload == 'ff00'
+    assert msg._payload == 'ff00'
+
+
+def test_topic_is_interned():
+    topic = ''.join(['sensors/', 'temp'])
+    assert Message(topic, b'').topic is Message('sensors/temp', b'').topic
+
+
+def test_bytes_per_message():
+    count = 100000
+    payload = b'x' * 20
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    msgs = [Message('sensors/{}/temp'.format(i % 100), payload, 1, False, i, 1000.0 + i) for i in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    overhead = (used - len(payload) * len(msgs)) / count
+    assert overhead < BYTES_PER_MESSAGE, '{:.1f} байт на сообщение'.format(overhead)
@@ -0,0 +1,58 @@
+from array import array
+
+import pytest
+from qtpy.QtTest import QAbstractItemModelTester
+
+from vqttt.message_model import MessageFilter, MessageModel
+
+
+@pytest.fixture
+def models(app):
+    topics = {}
+    model = MessageModel(None, max_capacity=0)
+    proxy = MessageFilter(None, topics)
+    proxy.setSourceModel(model)
+    tester = QAbstractItemModelTester(proxy, QAbstractItemModelTester.FailureReportingMode.Fatal)
+    yield model, proxy, topics
+    del tester
+
+
+def add(model, count, start=0):
+    model.store_records([('t/{}'.format(i % 2), float(i), 0, i, b'%d' % i) for i in range(start, start + count)])
+    model.publish()
+
+
+def test_unfiltered_rows_are_a_range(models):
+    model, proxy, topics = models
+    add(model, 100)
+    assert isinstance(proxy.rows, range)
+    assert proxy.rowCount() == 100
+    model.evict(30)
+    add(model, 10, 100)
+    assert proxy.rows == range(30, 110)
+    assert proxy.source_row(0) == 0
+    assert proxy.visible_seqs() == range(30, 110)
+
+
+def test_hiding_a_topic_materializes_rows(models):
+    model, proxy, topics = models
+    add(model, 100)
+    topics['t/1'] = {'show': False, 'qos': 0, 'mute': False}
+    proxy.topics_changed()
+    assert isinstance(proxy.rows, array)
+    assert list(proxy.rows) == list(range(0, 100, 2))
+    add(model, 4, 100)
+    assert list(proxy.rows[-2:]) == [100, 102]
+    topics['t/1']['show'] = True
+    proxy.topics_changed()
+    assert list(proxy.rows) == list(range(104))
+
+
+def test_clear_filter_returns_to_range(models):
+    model, proxy, topics = models
+    add(model, 50)
+    proxy.set_filter('7', False, False)
+    proxy.clear_filter()
+    assert proxy.rows == range(50)
+    model.evict(50)
+    assert proxy.rowCount() == 0
@@ -0,0 +1,37 @@
+from vqttt.message_model import MessageModel
+
+
+def add(model, start, count, payload=b'x' * 10):
+    model.store_records([('t', float(i), 0, i, payload) for i in range(start, start + count)])
+
+
+def test_pause_keeps_published_rows(app):
+    model = MessageModel(None, max_capacity=100)
+    removed = []
+    model.rowsRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+    add(model, 0, 100)
+    model.publish()
+    model.set_frozen(True)
+    for frame in range(2):
+        add(model, 100 + frame * 60, 60)
+        model.make_room()
+    assert model.rowCount() == 100
+    assert not removed
+    # Непоказанных не больше лимита; остальное не сохранено и посчитано
+    assert len(model.store) - model.published == 100
+    assert model.frozen_dropped == 20
+    model.set_frozen(False)
+    model.publish()
+    assert model.rowCount() == 100
+    assert model.store.first_seq == 100
+
+
+def test_pause_backlog_byte_limit(app):
+    model = MessageModel(None, max_capacity=0, max_bytes=1000)
+    add(model, 0, 50)
+    model.publish()
+    model.set_frozen(True)
+    for start in range(50, 200, 50):
+        add(model, start, 50)
+    assert len(model.store) == 150
+    assert model.frozen_dropped == 50
@@ -0,0 +1,67 @@
+import tracemalloc
+
+from vqttt.message import Message
+from vqttt.message_store import MessageStore, message_flags
+
+# Сколько байт на сообщение допустимо сверх самого payload
+BYTES_PER_MESSAGE = 64
+
+
+def fill(store, count, payload=b'x' * 20):
+    for i in range(count):
+        store.append_record('sensors/{}/temp'.format(i % 100), 1000.0 + i, message_flags(i % 3, i % 2), i,
+                            payload)
+
+
+def test_bytes_per_message():
+    count = 100000
+    store = MessageStore()
+    fill(store, 1000)
+    store.evict(len(store))
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    fill(store, count)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    overhead = (used - store.payload_bytes) / count
+    assert overhead < BYTES_PER_MESSAGE, '{:.1f} байт на сообщение'.format(overhead)
+
+
+def test_columns_round_trip():
+    store = MessageStore()
+    store.append(Message('a/b', b'\xff\x00', qos=2, retain=True, mid=70000, timestamp=5.5))
+    msg = store.message(0)
+    assert (msg.topic, msg.raw_payload, msg.qos, msg.retain, msg.mid, msg.timestamp) == \
+        ('a/b', b'\xff\x00', 2, True, 70000 & 0xFFFF, 5.5)
+
+
+def test_evict_keeps_seq_and_topic_rows():
+    store = MessageStore()
+    fill(store, 1000)
+    store.evict(250)
+    assert len(store) == 750
+    assert store.first_seq == 250 and store.end_seq == 1000
+    assert store.seq(0) == 250 and store.row(999) == 749
+    assert store.payload_bytes == 750 * 20
+    rows = store.topic_rows[store.topic_ids['sensors/7/temp']]
+    assert rows[0] == 307 and all(seq >= 250 for seq in rows)
+    assert store.topic(0) == 'sensors/50/temp'
+
+
+def test_evict_everything_and_refill():
+    store = MessageStore()
+    fill(store, 10)
+    store.evict(100)
+    assert len(store) == 0 and store.payload_bytes == 0
+    fill(store, 3, b'abc')
+    assert store.first_seq == 10 and store.payload(2) == b'abc'
+
+
+def test_rows_for_bytes():
+    store = MessageStore()
+    for size in (10, 20, 30, 40):
+        store.append_record('t', 0.0, 0, 0, b'x' * size)
+    assert store.rows_for_bytes(1) == 1
+    assert store.rows_for_bytes(30) == 2
+    assert store.rows_for_bytes(31) == 3
+    assert store.rows_for_bytes(10 ** 6) == 4
@@ -0,0 +1,56 @@
+from vqttt.replay import Replayer, TopicRemap
+
+
+class Client:
+    def __init__(self, fail_after=None):
+        self.published = []
+        self.fail_after = fail_after
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if self.fail_after is not None and len(self.published) >= self.fail_after:
+            raise TimeoutError()
+        self.published.append((topic, payload, qos, retain))
+
+    def publish_backlog(self):
+        return 0
+
+
+def replay(app, client, source, speed=0.0, remap=None):
+    replayer = Replayer()
+    replayer.report_interval = 0.0
+    progress, result = [], []
+    replayer.progress.connect(progress.append)
+    replayer.finished.connect(lambda stats, error: result.append((stats, error)))
+    replayer.start(client, source, speed, remap)
+    replayer.pool.waitForDone()
+    app.processEvents()
+    return progress, result
+
+
+def records(count):
+    return [('a/{}'.format(i), 100.0 + i * 0.001, 1, i, b'%d' % i) for i in range(count)]
+
+
+def test_topic_remap():
+    remap = TopicRemap('a/b = x ; =root')
+    assert remap('a/b') == 'x'
+    assert remap('a/b/c') == 'x/c'
+    assert remap('a/bc') == 'root/a/bc'
+    assert not TopicRemap('')
+
+
+def test_replay_publishes_all(app):
+    client = Client()
+    progress, result = replay(app, client, records(5), remap=TopicRemap('a=b'))
+    assert [topic for topic, _, _, _ in client.published] == ['b/{}'.format(i) for i in range(5)]
+    stats, error = result[0]
+    assert error == '' and stats.sent == 5
+    # Каждый отчёт — отдельный снимок, а не один меняющийся объект
+    assert [report.sent for report in progress] == list(range(1, 6))
+
+
+def test_error_without_text_is_reported(app):
+    progress, result = replay(app, Client(fail_after=2), records(5))
+    stats, error = result[0]
+    assert error == 'TimeoutError'
+    assert stats.sent == 2
@@ -0,0 +1,67 @@
+import pytest
+
+from vqttt.message_model import MessageFilter, MessageModel
+from vqttt.search_pattern import SearchPattern
+from vqttt.search_session import SearchSession
+
+
+@pytest.fixture
+def session(app):
+    topics = {'t/1': {'show': True, 'qos': 0, 'mute': False}}
+    model = MessageModel(None, max_capacity=0)
+    proxy = MessageFilter(None, topics)
+    proxy.setSourceModel(model)
+    # Чётные строки — t/0, нечётные — t/1; совпадают все
+    model.store_records([('t/{}'.format(i % 2), float(i), 0, i, b'hit %d' % i) for i in range(20)])
+    model.publish()
+    session = SearchSession(SearchPattern('hit'), proxy)
+    wait(app, session)
+    yield session, model, proxy, topics
+    session.close()
+
+
+def wait(app, session):
+    session.engine.pool.waitForDone()
+    app.processEvents()
+    assert not session.scanning
+
+
+def hits(session):
+    return [session.hit(i) for i in range(session.count)]
+
+
+def set_shown(proxy, topics, shown):
+    topics['t/1']['show'] = shown
+    proxy.topics_changed()
+
+
+def test_hide_and_show_topic(app, session):
+    session, model, proxy, topics = session
+    assert hits(session) == list(range(20))
+    set_shown(proxy, topics, False)
+    wait(app, session)
+    assert hits(session) == list(range(0, 20, 2))
+    i, wrapped = session.next_index(4)
+    assert proxy.row_of_seq(session.hit(i)) >= 0
+    set_shown(proxy, topics, True)
+    wait(app, session)
+    assert hits(session) == list(range(20))
+
+
+def test_hide_many_ranges_restarts(app, session):
+    session, model, proxy, topics = session
+    proxy.max_range_updates = 2
+    set_shown(proxy, topics, False)
+    wait(app, session)
+    assert hits(session) == list(range(0, 20, 2))
+    set_shown(proxy, topics, True)
+    wait(app, session)
+    assert hits(session) == list(range(20))
+
+
+def test_new_and_evicted_rows(app, session):
+    session, model, proxy, topics = session
+    model.store_records([('t/0', 20.0, 0, 20, b'hit'), ('t/0', 21.0, 0, 21, b'miss')])
+    model.publish()
+    model.evict(5)
+    assert hits(session) == list(range(5, 21))
@@ -0,0 +1,115 @@
+from vqttt import shm_ring
+from vqttt.shm_ring import HEADER_SIZE, READ_POS, RECEIVED, RECORD, WRITE_POS, ShmRingReader, ShmRingWriter
+
+
+class Model:
+    def __init__(self):
+        self.records = []
+
+    # Как хранилища: payload копируется, ссылки на кольцо не остаются
+    def store_records(self, records):
+        self.records.extend(record[:4] + (bytes(record[4]),) for record in records)
+
+
+def make_ring(capacity):
+    reader = ShmRingReader(capacity=capacity)
+    return reader, ShmRingWriter(reader.name)
+
+
+def test_wraparound():
+    reader, writer = make_ring(1024)
+    model = Model()
+    try:
+        sent = []
+        for i in range(200):
+            payload = b'p' * (i % 50)
+            assert writer.write(b'a/b', float(i), 1, i, payload)
+            sent.append(('a/b', float(i), 1, i, payload))
+            if i % 7 == 0:
+                reader.drain_into(model)
+        reader.drain_into(model)
+        assert model.records == sent
+        assert reader.get(WRITE_POS) > reader.capacity
+        assert len(reader) == 0
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_full_ring_rejects():
+    reader, writer = make_ring(256)
+    try:
+        written = 0
+        while writer.write(b't', 0.0, 0, 0, b'x' * 20):
+            written += 1
+        assert 0 < written * (RECORD.size + 21) <= 256
+        assert not writer.write(b't', 0.0, 0, 0, b'x' * 200)  # больше половины кольца
+        records, pos = reader.read()
+        assert len(records) == written
+        reader.release(pos)
+        assert writer.write(b't', 0.0, 0, 0, b'x' * 20)
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_record_not_yet_visible():
+    reader, writer = make_ring(1024)
+    model = Model()
+    try:
+        writer.write(b't', 1.0, 0, 1, b'first')
+        writer.write(b't', 2.0, 0, 2, b'second')
+        # Будто байты второй записи ещё не дошли до читателя: CRC не сойдётся
+        last = HEADER_SIZE + RECORD.size + 1 + 5 + RECORD.size + 1
+        reader.buf[last] ^= 0xFF
+        reader.drain_into(model)
+        assert [record[4] for record in model.records] == [b'first']
+        assert len(reader) == 1
+        reader.buf[last] ^= 0xFF
+        reader.drain_into(model)
+        assert [record[4] for record in model.records] == [b'first', b'second']
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_stale_record_from_previous_lap():
+    reader, writer = make_ring(1024)
+    model = Model()
+    try:
+        writer.write(b't', 1.0, 0, 1, b'x')
+        reader.drain_into(model)
+        # Читатель на следующем круге, а на месте новой записи видны данные прошлого круга
+        reader.set(READ_POS, reader.capacity)
+        reader.set(WRITE_POS, reader.capacity + 100)
+        records, pos = reader.read()
+        assert records == [] and pos == reader.capacity
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_close_after_producer_done():
+    reader, writer = make_ring(1024)
+    writer.write(b't', 0.0, 0, 0, b'x')
+    writer.count(RECEIVED)
+    writer.close()
+    reader.producer_done = True
+    model = Model()
+    reader.drain_into(model)
+    assert reader.buf is None
+    assert reader.received == 1
+    assert model.records[0][4] == b'x'
+    reader.close()
+
+
+def test_close_with_exported_buffer():
+    reader, writer = make_ring(1024)
+    writer.close()
+    view = reader.shm.buf[:8]
+    reader.close()
+    assert reader.shm in shm_ring.unclosed
+    view.release()
+    shm_ring.close_unclosed()
+    assert reader.shm not in shm_ring.unclosed
+
@@ -0,0 +1,41 @@
+import itertools
+
+from paho.mqtt.client import topic_matches_sub
+
+from vqttt.topic_matcher import TopicMute, TopicTrie, TopicVisibility
+
+SUBS = ['#', '+', 'a', 'a/b', 'a/+', 'a/#', '+/b', '+/+', 'a/b/c', 'a/+/c', '+/#', 'a/b/#',
+        '$SYS/#', '$SYS/+', '+/broker', '/a', '+/a', 'a/']
+TOPICS = ['a', 'a/b', 'a/b/c', 'a/x/c', 'b', 'b/b', '/a', 'a/', '$SYS/broker', '$SYS', 'x/broker',
+          'a/b/c/d']
+
+
+def test_trie_matches_paho():
+    trie = TopicTrie(SUBS)
+    for topic in TOPICS:
+        expected = sorted(sub for sub in SUBS if topic_matches_sub(sub, topic))
+        assert sorted(trie.match(topic)) == expected, topic
+
+
+def test_trie_each_sub_alone():
+    for sub, topic in itertools.product(SUBS, TOPICS):
+        assert bool(TopicTrie([sub]).match(topic)) == topic_matches_sub(sub, topic), (sub, topic)
+
+
+def test_visibility():
+    topics = {'a/#': {'show': False}, 'a/b': {'show': True}}
+    visibility = TopicVisibility(topics)
+    assert visibility.is_visible('other')
+    assert not visibility.is_visible('a/c')
+    assert visibility.is_visible('a/b')  # хотя бы одна подходящая подписка включена
+    topics['a/#']['show'] = True
+    assert not visibility.is_visible('a/c')  # закэшировано до invalidate
+    visibility.invalidate()
+    assert visibility.is_visible('a/c')
+
+
+def test_mute():
+    mute = TopicMute({'a/#': True, 'a/b': False})
+    assert mute.is_muted('a/c')
+    assert not mute.is_muted('a/b')
+    assert not mute.is_muted('b')
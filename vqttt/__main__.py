@@ -1,16 +1,19 @@
 import sys
 import logging
+import multiprocessing
 
-import qtpy
 
+# Qt нужен только GUI: `vqttt record` и процессы приёма работают без него
+def check_qt():
+    import qtpy
 
-if not qtpy.PYQT5 and not qtpy.PYSIDE2:
-    if sys.platform == 'linux':
-        sys.exit("Error: a compatible Qt library couldn't be imported.\n"
-                 "Please install python3-pyqt5 (or just python-pyqt5) from your package manager.")
-    else:
-        sys.exit("Error: a compatible Qt library couldn't be imported.\n"
-                 "Please install it by running `pip install pyqt5")
+    if not qtpy.PYQT5 and not qtpy.PYSIDE2:
+        if sys.platform == 'linux':
+            sys.exit("Error: a compatible Qt library couldn't be imported.\n"
+                     "Please install python3-pyqt5 (or just python-pyqt5) from your package manager.")
+        else:
+            sys.exit("Error: a compatible Qt library couldn't be imported.\n"
+                     "Please install it by running `pip install pyqt5")
 
 
 def init_logging():
@@ -32,6 +35,14 @@ def init_logging():
 
 
 def main():
+    # В собранном PyInstaller exe процессы приёма (spawn) запускают этот же файл:
+    # freeze_support выполнит в них код процесса и не даст открыть второе окно
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1 and sys.argv[1] == 'record':
+        from vqttt.recorder import main as record_main
+        sys.exit(record_main(sys.argv[2:], init_logging()))
+
+    check_qt()
     import signal
     from vqttt.main_window import MainWindow
     from vqttt.resources import qCleanupResources
@@ -47,6 +58,10 @@ def main():
     app.setWindowIcon(QIcon(':/vqttt_icon.png'))
     LOG = init_logging()
     mw = MainWindow(LOG, app)
+    # `vqttt файл.vqcap …` — сразу открыть записи во вкладках
+    # (аргументы Qt вроде -style QApplication уже убрал)
+    for path in app.arguments()[1:]:
+        mw.open_capture(path)
     signal.signal(signal.SIGINT, mw.signal_handler)
 
     sys.exit(app.exec_())
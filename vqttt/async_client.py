@@ -0,0 +1,200 @@
+import asyncio
+import socket
+import threading
+
+from .client import MqttClient
+
+
+class AsyncioLoop(threading.Thread):
+    # Общий asyncio-цикл для всех AsyncMqttClient в отдельном треде:
+    # GUI продолжает работать на обычном цикле Qt, число тредов не зависит от числа вкладок
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None or not cls._instance.is_alive():
+                cls._instance = cls()
+                cls._instance.start()
+                cls._instance.ready.wait()
+            return cls._instance.loop
+
+    @classmethod
+    def shutdown(cls, timeout=1.0):
+        with cls._instance_lock:
+            thread, cls._instance = cls._instance, None
+        if thread is not None:
+            thread.loop.call_soon_threadsafe(thread.loop.stop)
+            thread.join(timeout)
+
+    def __init__(self):
+        super().__init__(name='vqttt-asyncio', daemon=True)
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self.ready.set)
+        self.loop.run_forever()
+        for task in asyncio.all_tasks(self.loop):
+            task.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+
+
+class AsyncMqttClient(MqttClient):
+    # Тот же интерфейс и сигналы, что у MqttClient, но сеть обслуживает asyncio:
+    # сокет paho слушается через add_reader/add_writer, подключение — задача,
+    # которую можно отменить на любом шаге (разрешение имени, TCP, CONNACK)
+    misc_interval = 0.05  # сек; loop_misc и проверка обратного давления
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loop = None
+        self.connect_task = None
+        self.misc_task = None
+        self.connack = None
+        self.sock = None
+        self.reading = False
+        self.client.on_socket_open = self.on_socket_open
+        self.client.on_socket_close = self.on_socket_close
+        self.client.on_socket_register_write = self.on_socket_register_write
+        self.client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def connect_to_broker(self):
+        if self.state != MqttClient.Disconnected:
+            self.log.warn("Already connected")
+            return
+        self.state = MqttClient.Connecting
+        self.log.debug("Connecting to {}:{}".format(self.host_ip, self.host_port))
+        try:
+            self.client.connect_async(self.host_ip, self.host_port)
+        except Exception as e:
+            self.log.error("Excepting during connection: {}".format(e), exc_info=True)
+            self.on_connect_failed("Ошибка подключения: {}".format(e))
+            return
+        self.loop = AsyncioLoop.instance()
+        self.loop.call_soon_threadsafe(self.start_connect)
+
+    def start_connect(self):
+        self.connect_task = self.loop.create_task(self.connect_with_timeout())
+
+    async def connect_with_timeout(self):
+        try:
+            await asyncio.wait_for(self.open_connection(), self.connect_timeout)
+        except asyncio.TimeoutError:
+            self.close_socket()
+            self.on_connect_failed('Вышло время попытки подключения')
+        except asyncio.CancelledError:
+            self.close_socket()
+            self.on_disconnect(self.client, None, 0)
+            raise
+        except Exception as e:
+            self.close_socket()
+            self.on_connect_failed('Ошибка подключения: {}'.format(e))
+        else:
+            self.misc_task = self.loop.create_task(self.misc_loop())
+        finally:
+            self.connect_task = None
+
+    async def open_connection(self):
+        infos = await self.loop.getaddrinfo(self.host_ip, self.host_port, type=socket.SOCK_STREAM)
+        family, type_, proto, _, address = infos[0]
+        sock = socket.socket(family, type_, proto)
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        await self.loop.sock_connect(sock, address)
+        # Сокет уже подключён: paho только забирает его и отправляет CONNECT
+        self.client._create_socket_connection = lambda: sock
+        self.connack = self.loop.create_future()
+        self.client.reconnect()
+        await self.connack
+
+    async def misc_loop(self):
+        while self.client.socket() is not None:
+            self.client.loop_misc()
+            self.update_reading()
+            await asyncio.sleep(self.misc_interval)
+
+    # Для политики Block: не читать сокет, пока очередь приёма полна
+    def update_reading(self):
+        sock = self.client.socket()
+        if sock is None:
+            return
+        reading = self.queue.accepting()
+        if reading and not self.reading:
+            self.loop.add_reader(sock, self.on_readable)
+        elif not reading and self.reading:
+            self.loop.remove_reader(sock)
+        self.reading = reading
+
+    def on_readable(self):
+        self.client.loop_read()
+        self.update_reading()
+
+    def on_socket_open(self, client, userdata, sock):
+        self.reading = False
+        self.update_reading()
+
+    def on_socket_close(self, client, userdata, sock):
+        if self.reading:
+            self.loop.remove_reader(sock)
+            self.reading = False
+        if self.misc_task is not None:
+            self.misc_task.cancel()
+            self.misc_task = None
+        self.sock = None
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, self.client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    def close_socket(self):
+        if self.client.socket() is not None:
+            self.client._sock_close()
+        elif self.sock is not None:
+            self.sock.close()
+        self.sock = None
+
+    def disconnect(self):
+        if self.state == MqttClient.Disconnected:
+            return
+        self.loop.call_soon_threadsafe(self._disconnect)
+
+    def _disconnect(self):
+        if self.connect_task is not None:
+            self.connect_task.cancel()
+        else:
+            self.client.disconnect()
+
+    def on_connect(self, client, userdata, flags, rc):
+        if self.connack is not None and not self.connack.done():
+            self.connack.set_result(rc)
+        super().on_connect(client, userdata, flags, rc)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.client.publish, topic, payload, qos, retain)
+
+    def publish_backlog(self):
+        if self.loop is None:
+            return 0
+        return self.call(lambda: len(self.client._out_packet))
+
+    def subscribe(self, topic, qos=0):
+        if self.loop is not None:
+            self.call(self.client.subscribe, topic, qos)
+
+    def unsubscribe(self, topic):
+        if self.loop is not None:
+            self.call(self.client.unsubscribe, topic)
+
+    # Выполнить fn в цикле asyncio и дождаться результата (исключения пробрасываются)
+    def call(self, fn, *args, timeout=5.0):
+        async def run():
+            return fn(*args)
+        return asyncio.run_coroutine_threadsafe(run(), self.loop).result(timeout)
@@ -0,0 +1,70 @@
+import struct
+
+# Файл записи (.vqcap): заголовок MAGIC, затем записи подряд. Запись: полная длина,
+# время приёма, qos|retain, mid, длина топика (RECORD), затем топик (UTF-8) и payload.
+MAGIC = b'VQTTCAP\x01'
+RECORD = struct.Struct('<IdBHH')
+EXTENSION = '.vqcap'
+
+
+class CaptureWriter:
+    buffer_size = 1 << 20  # байт; запись на диск крупными блоками
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb', buffering=self.buffer_size)
+        self.file.write(MAGIC)
+        self.topic_bytes = {}
+        self.records = 0
+        self.size = len(MAGIC)
+
+    # records — кортежи (топик, время, флаги, mid, payload); одна запись в файл на пачку
+    def write_batch(self, records):
+        parts = []
+        topic_bytes = self.topic_bytes
+        for topic, timestamp, flags, mid, payload in records:
+            encoded = topic_bytes.get(topic)
+            if encoded is None:
+                encoded = topic_bytes[topic] = topic.encode('utf-8')
+            parts.append(RECORD.pack(RECORD.size + len(encoded) + len(payload), timestamp, flags,
+                                     mid & 0xFFFF, len(encoded)))
+            parts.append(encoded)
+            parts.append(payload)
+        data = b''.join(parts)
+        self.file.write(data)
+        self.records += len(records)
+        self.size += len(data)
+
+    def write(self, topic, timestamp, flags, mid, payload):
+        self.write_batch([(topic, timestamp, flags, mid, payload)])
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CaptureFormatError(Exception):
+    pass
+
+
+# Последовательное чтение: (топик, время, флаги, mid, payload) для каждой записи
+def iter_records(path):
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise CaptureFormatError('Не файл записи vqttt: {}'.format(path))
+        topics = {}
+        while True:
+            head = file.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return  # конец файла или недописанная последняя запись
+            size, timestamp, flags, mid, topic_len = RECORD.unpack(head)
+            body = file.read(size - RECORD.size)
+            if len(body) < size - RECORD.size:
+                return
+            topic_bytes = body[:topic_len]
+            topic = topics.get(topic_bytes)
+            if topic is None:
+                topic = topics[topic_bytes] = topic_bytes.decode('utf-8', 'replace')
+            yield topic, timestamp, flags, mid, body[topic_len:]
@@ -0,0 +1,65 @@
+import logging
+
+from qtpy.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from .capture import CaptureFormatError
+from .disk_store import CaptureStore
+
+log = logging.getLogger('VQ.CaptureLoader')
+
+
+class CaptureLoadSignals(QObject):
+    progress = Signal(int, int)
+    finished = Signal(object, str)  # CaptureStore или DiskStore (None при ошибке), текст ошибки
+
+
+class CaptureLoadJob(QRunnable):
+    def __init__(self, loader, path, store_class):
+        super().__init__()
+        self.signals = CaptureLoadSignals()
+        self.signals.progress.connect(loader.progress)
+        self.signals.finished.connect(loader.finished)
+        self.loader = loader
+        self.path = path
+        self.store_class = store_class
+
+    def on_progress(self, done, total):
+        self.signals.progress.emit(done, total)
+        return not self.loader.cancelled
+
+    def run(self):
+        try:
+            store = self.store_class(self.path)
+            store.load(self.on_progress)
+        except (OSError, CaptureFormatError) as e:
+            self.signals.finished.emit(None, str(e))
+            return
+        except Exception as e:
+            # Повреждённый файл может сломать разбор где угодно: вкладка всё равно должна узнать
+            log.error('Не удалось открыть {}'.format(self.path), exc_info=True)
+            self.signals.finished.emit(None, str(e) or type(e).__name__)
+            return
+        if self.loader.cancelled:
+            store.close()
+        else:
+            self.signals.finished.emit(store, '')
+
+
+class CaptureLoader(QObject):
+    # Открытие файла записи (или каталога DiskStore) в фоне: индексация большого файла
+    # в первый раз занимает время, а GUI тем временем показывает прогресс
+    progress = Signal(int, int)
+    finished = Signal(object, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cancelled = False
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+
+    def start(self, path, store_class=CaptureStore):
+        self.cancelled = False
+        self.pool.start(CaptureLoadJob(self, path, store_class))
+
+    def cancel(self):
+        self.cancelled = True
@@ -1,37 +1,28 @@
-import binascii
+import time
 import paho.mqtt.client as mqtt
-from datetime import datetime
-from qtpy.QtCore import Signal, QThread, QTimer, QDeadlineTimer
+from qtpy.QtCore import QObject, Signal
 
+from .message import Message
+from .headless_client import disconnect_reason
+from .ingress_queue import IngressQueue
+from .reactor import Reactor, ReactorConnection
+from .topic_matcher import TopicMute
 
-class Message:
-    def __init__(self, msg):
-        self.raw_msg = msg
 
-        self.qos = msg.qos
-        self.retain = msg.retain
-        self.topic = msg.topic
-        self.time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        try:
-            self.payload = msg.payload.decode('utf-8', 'backslashreplace')
-        except Exception:
-            self.payload = binascii.hexlify(msg.payload, ' ', 2)
-
-    def __repr__(self):
-        return "{}(topic={}, payload={})".format(self.__class__.__name__, self.topic, self.payload)
-
-
-class MqttClient(QThread):
+class MqttClient(QObject):
     Disconnected = 1
     Connecting = 2
     Connected = 3
 
-    new_message = Signal(Message)
+    # Очередь приёма стала непустой; GUI забирает сообщения сам через take_messages
+    messages_available = Signal()
     connected = Signal()
     disconnected = Signal(str)
 
-    def __init__(self, ip, log, port=1883, username=None, password=None, client_id=None, parent=None):
+    connect_timeout = 2.0  # сек на разрешение имени, TCP и CONNACK
+
+    def __init__(self, ip, log, port=1883, username=None, password=None, client_id=None, parent=None,
+                 queue=None):
         super().__init__(parent)
         self.host_ip, self.host_port = ip, port
         self.username, self.password = username, password
@@ -44,7 +35,15 @@ class MqttClient(QThread):
         self.client.on_disconnect = self.on_disconnect
         self.client.on_connect = self.on_connect
         self.client.username_pw_set(username, password)
-        self.conn_timer = None
+        # Сетью всех клиентов занимается общий тред Reactor; сигналы из него
+        # приходят в GUI через очередь событий Qt
+        self.reactor = None
+        self.conn = None
+
+        # Тред сети складывает сообщения в ограниченную очередь, GUI забирает их раз в кадр
+        self.queue = IngressQueue() if queue is None else queue
+        # TopicMute или None; заменяется из GUI целиком через set_muted_topics
+        self.mute = None
 
     # Название `connect` создаёт проблемы с QObject.connect в PySide2
     def connect_to_broker(self):
@@ -52,89 +51,93 @@ class MqttClient(QThread):
             self.log.warn("Already connected")
             return
         self.state = MqttClient.Connecting
-
-        # Таймер для остановки зависшего client.connect
-        self.conn_timer = QTimer(None)
-        self.conn_timer.setSingleShot(True)
-        self.conn_timer.setInterval(2000)
-        self.conn_timer.timeout.connect(self.conn_success_check)
-        self.conn_timer.start()
-        self.start()
+        self.log.debug("Connecting to {}:{}".format(self.host_ip, self.host_port))
+        try:
+            self.client.connect_async(self.host_ip, self.host_port)
+        except Exception as e:
+            self.log.error("Excepting during connection: {}".format(e), exc_info=True)
+            self.on_connect_failed("Ошибка подключения: {}".format(e))
+            return
+        self.reactor = Reactor.instance()
+        self.conn = ReactorConnection(self.client, self.host_ip, self.host_port, self.connect_timeout,
+                                      self.on_connect_failed, self.queue.accepting)
+        self.reactor.add(self.conn)
 
     def disconnect(self):
         if self.state == MqttClient.Disconnected:
             return
-        self.client.disconnect()
-
-    # Нужен запуск в своём треде чтобы .connect не остановил всю программу.
-    # connect_async+loop_start не помогут так как loop_stop может зависнуть.
-    # Но self.terminate тоже может зависнуть??? Ад.
-    def run(self):
-        self.log.debug("Starting client thread")
-        rc = 0
-        try:
-            self.client.connect(self.host_ip, self.host_port)
-            self.client.loop_start()
-            self.log.debug("Client loop started, thread finished")
-        except Exception as e:
-            self.log.error("Excepting during connection: {}".format(e), exc_info=True)
-            self.disconnected.emit("Ошибка подключения (код {}): {}".format(rc, e))
-            self.state = MqttClient.Disconnected
+        self.reactor.call_soon(self._disconnect)
+
+    # Вкладка закрывается: у клиентов на общем треде сети освобождать нечего, кроме подключения
+    def close(self):
+        self.disconnect()
+
+    def _disconnect(self):
+        if self.client.socket() is None:
+            # Ещё не подключились: отменить попытку
+            self.conn.close()
+            self.on_disconnect(self.client, None, 0)
+        else:
+            self.client.disconnect()
 
     def publish(self, topic, payload, qos=0, retain=False):
-        self.client.publish(topic, payload, qos, retain)
+        if self.reactor is not None:
+            self.reactor.call_soon(self.client.publish, topic, payload, qos, retain)
+
+    # Сколько пакетов ждут отправки в сокет (для ожидания при массовой публикации)
+    def publish_backlog(self):
+        if self.reactor is None:
+            return 0
+        return self.reactor.call(lambda: len(self.client._out_packet))
 
     def on_message(self, client, userdata, msg):
+        # Время приёма пакета, а не создания объекта в GUI
+        received = time.time()
+        mute = self.mute
         try:
-            msg = Message(msg)
+            if mute is not None and mute.is_muted(msg.topic):
+                self.queue.muted += 1
+                return
+            msg = Message.from_mqtt(msg, received)
         except Exception as e:
-            print('Ошибка обработки сообщения:', e)
-        self.new_message.emit(msg)
+            self.log.error('Ошибка обработки сообщения: {}'.format(e))
+            return
+        if self.queue.put(msg):
+            self.messages_available.emit()
 
+    def take_messages(self, limit=None):
+        return self.queue.take(limit)
+
+    def set_ingress_policy(self, policy):
+        self.queue.set_policy(policy)
+
+    # muted — подписка -> заглушена ли
+    def set_muted_topics(self, muted):
+        self.mute = TopicMute(muted) if any(muted.values()) else None
+
+    # Ошибки аргументов paho (неверный топик, qos) пробрасываются вызывающему
     def subscribe(self, topic, qos=0):
-        self.client.subscribe(topic, qos)
+        if self.reactor is not None:
+            self.reactor.call(self.client.subscribe, topic, qos)
 
     def unsubscribe(self, topic):
-        self.client.unsubscribe(topic)
+        if self.reactor is not None:
+            self.reactor.call(self.client.unsubscribe, topic)
 
     def on_connect(self, client, userdata, flags, rc):
         self.state = MqttClient.Connected
         if rc == 0:
+            if self.conn is not None:
+                self.conn.established()
             self.connected.emit()
         else:
             self.log.warn("Connection with non-zero rc: {}".format(rc))
 
     def on_disconnect(self, client, userdata, rc):
         self.state = MqttClient.Disconnected
-        if rc != 0:
-            self.stop_connection()
-        if rc == 1:
-            self.disconnected.emit('Соединение закрыто')
-        elif rc == 5:
-            self.disconnected.emit('Ошибка авторизации')
-        else:
-            self.disconnected.emit('')
-
-    # Возвращает True если было что остановить
-    def stop_connection(self):
-        self.log.debug("Stopping the connection")
-        self.client.loop_stop()
-        if self.isRunning():
-            self.log.debug("Asking thread to quit")
-            self.quit()
-            t = QDeadlineTimer()
-            t.setRemainingTime(1000)
-            if not self.wait(t):
-                self.log.warn("Thread didn't stop, terminating")
-                self.terminate()
-                self.log.debug("Thread terminated")
-            return True
-        return False
-
-    def conn_success_check(self):
-        self.log.debug("Checking connection success")
-        self.conn_timer = None
-        if self.state != self.Connected:
-            self.log.debug("Connection didn't succeed, stopping")
-            if self.stop_connection():
-                self.disconnected.emit("Вышло время попытки подключения")
+        self.disconnected.emit(disconnect_reason(rc))
+
+    def on_connect_failed(self, reason):
+        self.log.debug("Connection failed: {}".format(reason))
+        self.state = MqttClient.Disconnected
+        self.disconnected.emit(reason)
@@ -1,15 +1,31 @@
+import re
 from functools import partial
-from qtpy.QtCore import Qt, QFile
+from qtpy.QtCore import Qt, QFile, QTimer
 from qtpy.QtWidgets import QWidget, QShortcut, QMenu, QHeaderView, QCheckBox, \
-                           QHBoxLayout, QTableWidgetItem, QLineEdit
+                           QHBoxLayout, QTableWidgetItem, QLineEdit, QPushButton
 from qtpy.QtGui import QIntValidator
 
 from .utils import loadUi
 from .client import MqttClient
-from .message_model import MessageModel, MessageFilter, INVALID_INDEX, SearchRole
+from .async_client import AsyncMqttClient
+from .process_client import ProcessMqttClient
+from .ingress_queue import IngressQueue
+from .message_model import MessageModel, MessageFilter
+from .disk_store import DiskStore
+from .capture_loader import CaptureLoader
+from .exporter import Exporter
+from .replay import Replayer
+from .search_session import SearchSession
+from .search_pattern import SearchPattern
 
 
 class ConnectionTab(QWidget):
+    default_refresh_rate = 30  # кадров в секунду
+    default_disk_retention = 10 * 1024 ** 3  # байт на диске для вкладки с DiskStore
+    # Чем обслуживать сеть: общий тред-реактор на selectors, общий цикл asyncio
+    # или отдельный процесс приёма на каждое подключение
+    client_backends = {'reactor': MqttClient, 'asyncio': AsyncMqttClient, 'process': ProcessMqttClient}
+
     def __init__(self, parent, log, name, main_window):
         super().__init__(parent)
         self.client = None
@@ -24,8 +40,31 @@ class ConnectionTab(QWidget):
         self.search_bar_visible = False
         self.search_regex = False
         self.search_casesensitive = False
-        self.search_start = 0  # для search_down
+        self.search_session = None
+        self.search_direction = 1
+        self.search_pending = False  # переход ждёт результатов фонового поиска
+        self.pending_selection = None  # seq выделенной строки до фонового пересчёта фильтра
         self.popped_out = False
+        self.paused = False  # таблица заморожена, новые сообщения копятся в модели
+        self.ingress_policy = IngressQueue.DropNewest
+        self.ingress = None  # очередь приёма текущего (или последнего) клиента, со счётчиками
+        self.client_backend = 'reactor'  # ключ client_backends, применяется при следующем подключении
+        self.disk_directory = None  # каталог DiskStore, если сообщения хранятся на диске
+        self.disk_loader = None  # открывает DiskStore в фоне
+        self.capture_path = None  # открытый файл записи: вкладка только для просмотра
+
+        # Новые сообщения сразу сохраняются в модель, а показываются и прокручиваются
+        # не чаще refresh_rate раз в секунду, независимо от потока сообщений
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.timeout.connect(self.refresh_view)
+        self.set_refresh_rate(self.default_refresh_rate)
+        self.exporter = Exporter(self)
+        self.exporter.progress.connect(self.on_export_progress)
+        self.exporter.finished.connect(self.on_export_finished)
+        self.replayer = Replayer(self)
+        self.replayer.progress.connect(self.on_replay_progress)
+        self.replayer.finished.connect(self.on_replay_finished)
         self.setupUi()
 
     def setupUi(self):
@@ -48,6 +87,8 @@ class ConnectionTab(QWidget):
 
         self.filter_model = MessageFilter(self, self.topics)
         self.filter_model.setSourceModel(self.message_model)
+        self.filter_model.filter_progress.connect(self.on_filter_progress)
+        self.filter_model.filter_finished.connect(self.on_filter_finished)
         self.messageTable.setModel(self.filter_model)
 
         self.messageTable.verticalScrollBar().rangeChanged.connect(self.on_range_changed)
@@ -59,8 +100,25 @@ class ConnectionTab(QWidget):
         self.messageDetailText.setText("")
 
         self.topicsTable.doubleClicked.connect(self.topic_double_clicked)
+        self.topicsTable.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.topicsTable.customContextMenuRequested.connect(self.topics_context_menu)
         self.topicsTable.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
 
+        # Кнопка паузы рядом с заголовком таблицы сообщений
+        self.pauseButton = QPushButton('Пауза', self.widget)
+        self.pauseButton.setCheckable(True)
+        self.pauseButton.setToolTip('Остановить обновление таблицы, не отключаясь (Ctrl+P)')
+        self.pauseButton.toggled.connect(self.set_paused)
+        messages_header = QHBoxLayout()
+        self.verticalLayout.removeWidget(self.label_7)
+        messages_header.addWidget(self.label_7)
+        messages_header.addStretch()
+        messages_header.addWidget(self.pauseButton)
+        self.verticalLayout.insertLayout(0, messages_header)
+        self.pauseSC = QShortcut('Ctrl+P', self)
+        self.pauseSC.activated.connect(self.pauseButton.toggle)
+        self.pauseSC.setAutoRepeat(False)
+
         self.searchWidget.setHidden(True)
         self.searchSC = QShortcut('Ctrl+F', self)
         self.searchSC.activated.connect(self.toggle_search)
@@ -70,6 +128,10 @@ class ConnectionTab(QWidget):
         self.searchSC_F3.activated.connect(self.search_down_or_close)
         self.searchSC_F3.setAutoRepeat(True)
 
+        self.searchSC_ShiftF3 = QShortcut('Shift+F3', self)
+        self.searchSC_ShiftF3.activated.connect(self.search_up)
+        self.searchSC_ShiftF3.setAutoRepeat(True)
+
         self.searchSC_Home = QShortcut('Home', self)
         self.searchSC_Home.activated.connect(partial(self.messageTable.selectRow, 0))
         self.searchSC_Home.setAutoRepeat(False)
@@ -80,6 +142,7 @@ class ConnectionTab(QWidget):
 
         self.setup_search_button_menu()
 
+        self.searchLine.textChanged.connect(self.close_search_session)
         self.searchLine.returnPressed.connect(self.search_down)
         self.searchDownButton.clicked.connect(self.search_down)
         self.searchDownButton.setMenu(self.setup_search_button_menu())
@@ -100,13 +163,23 @@ class ConnectionTab(QWidget):
         action_case.setCheckable(True)
         action_case.setChecked(self.search_casesensitive)
         action_case.triggered.connect(self.set_search_casesensitive)
+        smenu.addSeparator()
+        action_index = smenu.addAction('Индекс поиска')
+        action_index.setCheckable(True)
+        action_index.setChecked(self.message_model.search_index is not None)
+        action_index.triggered.connect(self.set_search_index_enabled)
         return smenu
 
     def set_search_regex(self, enabled):
         self.search_regex = enabled
+        self.close_search_session()
 
     def set_search_casesensitive(self, enabled):
         self.search_casesensitive = enabled
+        self.close_search_session()
+
+    def set_search_index_enabled(self, enabled):
+        self.message_model.set_search_index_enabled(enabled)
 
     def on_scroll(self, pos):
         if pos < self.scroll_max:
@@ -118,6 +191,8 @@ class ConnectionTab(QWidget):
         self.scroll_max = max
 
     def connect_toggle(self):
+        if self.capture_path is not None:
+            return
         if self.client and self.client.state == MqttClient.Connecting:
             return
         if self.client and self.client.state == MqttClient.Connected:
@@ -132,8 +207,16 @@ class ConnectionTab(QWidget):
         username = self.usernameLine.text()
         password = self.passwordLine.text()
         client_id = self.clientIdLine.text()
-        self.client = MqttClient(ip, self.log, port, username, password, client_id, self)
-        self.client.new_message.connect(self.on_message)
+        if self.ingress is not None:
+            # Очередь прошлого подключения больше не нужна (кольцо процесса приёма — закрыть)
+            self.drain_ingress()
+            self.ingress.close()
+        client_class = self.client_backends[self.client_backend]
+        self.client = client_class(ip, self.log, port, username, password, client_id, self,
+                                   IngressQueue(policy=self.ingress_policy))
+        self.ingress = self.client.queue
+        self.client.messages_available.connect(self.schedule_refresh)
+        self.update_muted_topics()
         self.client.connected.connect(self.connected)
         self.client.disconnected.connect(self.disconnected)
         self.connectButton.setText("Подключение...")
@@ -152,16 +235,20 @@ class ConnectionTab(QWidget):
     def subscribe(self, topic=None):
         if type(topic) is not str:
             topic = self.subTopicLine.text()
-        if len(topic) == 0 or topic in self.topics or self.client is None:
+        if len(topic) == 0 or topic in self.topics or (self.client is None and self.capture_path is None):
             return
         qos = int(self.subQosSelector.currentText().replace('QoS', ''))
-        try:
-            self.client.subscribe(topic, qos)
-        except Exception as e:
-            self.log.error("Ошибка при подписке", e, exc_info=True)
-            return
-        self.topics[topic] = {'show': True, 'qos': qos}
+        # В записи «подписка» — только строка в списке топиков для фильтра
+        if self.client is not None:
+            try:
+                self.client.subscribe(topic, qos)
+            except Exception as e:
+                self.log.error("Ошибка при подписке: %s", e, exc_info=True)
+                return
+        self.topics[topic] = {'show': True, 'qos': qos, 'mute': False}
         self.add_topic_to_table(topic)
+        self.filter_model.topics_changed()
+        self.update_muted_topics()
 
     def add_topic_to_table(self, topic):
         row_count = self.topicsTable.rowCount()
@@ -196,6 +283,43 @@ class ConnectionTab(QWidget):
                 self.log.error("Ошибка при отписке", e, exc_info=True)
         del self.topics[topic]
         self.remove_topic_from_table(topic)
+        self.invalidate_filter()
+        self.update_muted_topics()
+
+    def topic_row(self, topic):
+        for row in range(self.topicsTable.rowCount()):
+            if self.topicsTable.item(row, 1).text() == topic:
+                return row
+        return -1
+
+    def topics_context_menu(self, pos):
+        row = self.topicsTable.indexAt(pos).row()
+        if row < 0:
+            return
+        topic = self.topicsTable.item(row, 1).text()
+        menu = QMenu(self.topicsTable)
+        action_mute = menu.addAction('Не принимать сообщения')
+        action_mute.setCheckable(True)
+        action_mute.setChecked(self.topics[topic]['mute'])
+        action_mute.triggered.connect(partial(self.set_topic_muted, topic))
+        action_unsubscribe = menu.addAction('Отписаться')
+        action_unsubscribe.triggered.connect(partial(self.unsubscribe, topic))
+        menu.exec_(self.topicsTable.viewport().mapToGlobal(pos))
+
+    # Заглушённые топики отбрасываются клиентом сразу при приёме и не занимают место
+    # в модели; в отличие от снятой галочки, скрытые так сообщения не вернуть
+    def set_topic_muted(self, topic, muted):
+        self.topics[topic]['mute'] = muted
+        item = self.topicsTable.item(self.topic_row(topic), 1)
+        font = item.font()
+        font.setStrikeOut(muted)
+        item.setFont(font)
+        item.setToolTip('Сообщения не принимаются' if muted else '')
+        self.update_muted_topics()
+
+    def update_muted_topics(self):
+        if self.client is not None:
+            self.client.set_muted_topics({t: v['mute'] for t, v in self.topics.items()})
 
     def remove_topic_from_table(self, topic):
         for row in range(self.topicsTable.rowCount()):
@@ -225,39 +349,146 @@ class ConnectionTab(QWidget):
             topic = self.topicsTable.item(row, column).text()
             self.unsubscribe(topic)
 
-    def on_message(self, msg):
-        self.message_model.add_message(msg)
+    def schedule_refresh(self):
+        if not self.refresh_timer.isActive():
+            self.refresh_timer.start()
+
+    # Забрать всё, что накопилось в очереди приёма, в модель (без показа)
+    def drain_ingress(self):
+        if self.ingress is not None:
+            self.ingress.drain_into(self.message_model)
+
+    def set_ingress_policy(self, policy):
+        self.ingress_policy = policy
+        if self.client is not None:
+            self.client.set_ingress_policy(policy)
+
+    def set_refresh_rate(self, fps):
+        self.refresh_rate = fps
+        self.refresh_timer.setInterval(max(1, 1000 // fps))
+
+    # На паузе сообщения продолжают сохраняться, но в таблицу не попадают, а показанные строки
+    # не вытесняются; новых копится не больше лимитов вкладки (см. MessageModel.fit_backlog).
+    # При снятии паузы всё накопленное вставляется одним кадром, лишнее старое вытесняется
+    def set_paused(self, paused):
+        if paused == self.paused:
+            return
+        self.drain_ingress()
+        self.paused = paused
+        self.message_model.set_frozen(paused)
+        if self.pauseButton.isChecked() != paused:
+            self.pauseButton.setChecked(paused)
+        if paused:
+            self.main_window.statusbar.showMessage('Пауза: сообщения принимаются, таблица не обновляется', 3000)
+        else:
+            self.refresh_view()
+        self.update_pause_label()
+
+    def update_pause_label(self):
+        if self.paused:
+            model = self.message_model
+            pending = len(model.store) - model.published
+            text = 'Сообщения (пауза, новых: {}'.format(pending)
+            if model.frozen_dropped:
+                text += ', не сохранено: {}'.format(model.frozen_dropped)
+            self.label_7.setText(text + ')')
+        else:
+            self.label_7.setText('Сообщения')
+
+    # Один кадр: накопленные строки вставляются одним уведомлением, прокрутка — одна
+    def refresh_view(self):
+        self.drain_ingress()
+        if self.paused:
+            self.update_pause_label()
+            return
+        first_batch = self.message_model.rowCount() == 0
+        if not self.message_model.publish():
+            return
         if self.autoscroll:
             self.messageTable.scrollToBottom()
 
         # Установить автоматическую ширину для некоторых столбцов после первого сообщения
-        if self.message_model.rowCount() == 1:
+        if first_batch:
             header = self.message_model.table_header
             resize_columns = [i for i, v in enumerate(header) if v[0] in ['color', 'time']]
             for col in resize_columns:
                 self.messageTable.resizeColumnToContents(col)
 
     def search_down(self):
-        start = self.filter_model.index(self.search_start, 0, INVALID_INDEX)
-        s = self.searchLine.text()
+        self.search_step(1)
 
-        if not self.search_regex:
-            search_flags = Qt.MatchContains
+    def search_up(self):
+        self.search_step(-1)
+
+    # Переход к следующему/предыдущему совпадению от выделенной строки. Список совпадений
+    # (SearchSession) считается один раз для шаблона; если нужное совпадение ещё не найдено
+    # фоновым проходом, переход выполняется, как только оно появится.
+    def search_step(self, direction):
+        pattern = self.make_search_pattern()
+        if pattern is None or not pattern.text:
+            return
+        if self.search_session is None or self.search_session.pattern != pattern:
+            self.close_search_session()
+            self.search_session = SearchSession(pattern, self.filter_model, self)
+            self.search_session.changed.connect(self.on_search_changed)
+        self.search_direction = direction
+        self.search_pending = True
+        self.search_jump()
+
+    def search_jump(self):
+        session = self.search_session
+        seq = self.selected_seq()
+        if self.search_direction > 0:
+            i, wrapped = session.next_index(seq)
         else:
-            search_flags = Qt.MatchRegExp
-        if self.search_casesensitive:
-            search_flags = search_flags | Qt.MatchCaseSensitive
-
-        hits = self.filter_model.match(start, SearchRole, s, 1, Qt.MatchWrap | search_flags)
-        print(hits)
-        if not hits:
-            self.main_window.statusbar.showMessage('Поиск дошел до конца', 4000)
-            self.search_start = 0
+            i, wrapped = session.prev_index(seq)
+        if (i is None or wrapped) and session.scanning:
+            self.show_search_count()
+            return
+        self.search_pending = False
+        if i is None:
+            self.main_window.statusbar.showMessage('Совпадений нет', 4000)
+            return
+        pos = self.filter_model.row_of_seq(session.hit(i))
+        if pos < 0:
+            return
+        result = self.filter_model.index(pos, 0)
+        self.messageTable.scrollTo(result)
+        self.messageTable.setCurrentIndex(result)
+        self.show_search_count('Поиск дошел до конца. ' if wrapped else '')
+
+    def on_search_changed(self):
+        if self.search_pending:
+            self.search_jump()
+        else:
+            self.show_search_count()
+
+    def show_search_count(self, prefix=''):
+        session = self.search_session
+        seq = self.selected_seq()
+        i = session.index_of(seq) if seq is not None else None
+        if i is None:
+            text = 'Совпадений: {}'.format(session.count)
         else:
-            result = hits[0]
-            self.search_start = result.row() + 1
-            self.messageTable.scrollTo(result)
-            self.messageTable.setCurrentIndex(result)
+            text = 'Совпадение {} из {}'.format(i + 1, session.count)
+        if session.scanning:
+            text += '…'
+        self.main_window.statusbar.showMessage(prefix + text, 4000)
+
+    def close_search_session(self):
+        if self.search_session is not None:
+            self.search_session.close()
+            self.search_session.deleteLater()
+            self.search_session = None
+            self.search_pending = False
+
+    # Общий шаблон для поиска и фильтра; None и сообщение в статусе, если выражение с ошибкой
+    def make_search_pattern(self):
+        try:
+            return SearchPattern(self.searchLine.text(), self.search_regex, self.search_casesensitive)
+        except re.error as e:
+            self.main_window.statusbar.showMessage('Ошибка в регулярном выражении: {}'.format(e), 5000)
+            return None
 
     def search_down_or_close(self):
         if self.search_bar_visible is False:
@@ -283,30 +514,185 @@ class ConnectionTab(QWidget):
 
     def filter_or_clear(self):
         if not self.filter_model.search_filter:
+            if self.make_search_pattern() is None:
+                return
             self.filterButton.setText('Сбросить')
-            self.filter_model.set_filter(self.searchLine.text(), self.search_regex,
-                                         self.search_casesensitive)
+            self.refilter(partial(self.filter_model.set_filter, self.searchLine.text(),
+                                  self.search_regex, self.search_casesensitive))
         else:
             self.filterButton.setText('Фильтр')
-            self.filter_model.clear_filter()
-            self.invalidate_filter()
+            self.refilter(self.filter_model.clear_filter)
 
     def topic_show_changed(self, topic, value):
         self.topics[topic]['show'] = value
         self.invalidate_filter()
 
     def set_max_capacity(self, max_capacity):
-        self.message_model.max_capacity = max_capacity
-        self.message_model.trim_if_needed()
+        self.message_model.set_max_capacity(max_capacity)
+
+    def set_max_bytes(self, max_bytes):
+        self.message_model.set_max_bytes(max_bytes)
+
+    # Хранить сообщения в каталоге на диске; лимит числа строк снимается, лимит байт — место на диске
+    def set_disk_store(self, directory):
+        if self.disk_loader is not None:
+            self.disk_loader.cancel()
+        # Уже записанная история индексируется в фоне, до тех пор сообщения копятся в памяти
+        self.disk_loader = CaptureLoader(self)
+        self.disk_loader.finished.connect(partial(self.on_disk_store_loaded, self.disk_loader, directory))
+        self.disk_loader.start(directory, DiskStore)
+        self.main_window.statusbar.showMessage('Открывается каталог: {}'.format(directory), 3000)
+
+    def on_disk_store_loaded(self, loader, directory, store, error):
+        if loader is not self.disk_loader:
+            if store is not None:
+                store.close()
+            return
+        self.disk_loader = None
+        if store is None:
+            self.main_window.statusbar.showMessage('Не удалось открыть каталог: {}'.format(error), 5000)
+            return
+        self.drain_ingress()
+        self.message_model.max_capacity = 0
+        self.message_model.set_store(store)
+        self.message_model.set_max_bytes(self.default_disk_retention)
+        self.disk_directory = directory
+        self.log.info('Сообщения хранятся в {}, {} уже записано'.format(directory, len(store)))
+        self.main_window.update_memory_label()
+
+    # Открыть файл записи вместо подключения; индекс строится в фоне
+    def open_capture(self, path):
+        self.capture_path = path
+        self.connInfoWrapper.setHidden(True)
+        self.connectButton.setHidden(True)
+        self.connInfoLabel.setText('Открывается запись: {}'.format(path))
+        for widget in (self.subscribeButton, self.subTopicLine, self.subQosSelector):
+            widget.setEnabled(True)
+        self.capture_loader = CaptureLoader(self)
+        self.capture_loader.progress.connect(self.on_capture_progress)
+        self.capture_loader.finished.connect(self.on_capture_loaded)
+        self.capture_loader.start(path)
+
+    def on_capture_progress(self, done, total):
+        self.main_window.statusbar.showMessage('Индексация записи: {}%'.format(done * 100 // total), 2000)
+
+    def on_capture_loaded(self, store, error):
+        if store is None:
+            self.connInfoLabel.setText('Не удалось открыть запись: {}'.format(error))
+            self.main_window.statusbar.showMessage(error, 5000)
+            return
+        self.message_model.max_capacity = 0
+        self.message_model.max_bytes = 0
+        self.message_model.set_store(store)
+        self.connInfoLabel.setText('Запись: {}'.format(self.capture_path))
+        self.main_window.statusbar.showMessage('Открыто сообщений: {}'.format(len(store)), 3000)
+        self.main_window.update_memory_label()
+        self.refresh_view()
+
+    # Экспорт в фоне; visible_only — только строки, прошедшие фильтр, в порядке таблицы
+    def export_rows(self, path, visible_only=False):
+        if self.exporter.running:
+            self.main_window.statusbar.showMessage('Экспорт уже идёт', 3000)
+            return
+        self.refresh_view()
+        model = self.message_model
+        if visible_only:
+            seqs = self.filter_model.visible_seqs()
+        else:
+            seqs = range(model.store.first_seq, model.published_end_seq)
+        self.export_path = path
+        self.log.info('Экспорт {} строк в {}'.format(len(seqs), path))
+        self.exporter.start(model.store, seqs, path)
+
+    def on_export_progress(self, done, total):
+        self.main_window.statusbar.showMessage('Экспорт: {}%'.format(done * 100 // total), 2000)
+
+    def on_export_finished(self, written, error):
+        if error:
+            text = 'Экспорт прерван ({}), записано строк: {}'.format(error, written)
+        else:
+            text = 'Экспортировано строк: {} в {}'.format(written, self.export_path)
+        self.main_window.statusbar.showMessage(text, 5000)
+
+    # Публиковать записанный трафик через клиент этой вкладки; source — см. replay.py
+    def start_replay(self, source, speed, remap):
+        if self.client is None or self.client.state != MqttClient.Connected:
+            self.main_window.statusbar.showMessage('Для воспроизведения нужно подключение', 4000)
+            return
+        if self.replayer.running:
+            self.main_window.statusbar.showMessage('Воспроизведение уже идёт', 3000)
+            return
+        self.replay_speed = speed
+        self.log.info('Воспроизведение, скорость {}'.format('максимальная' if not speed else 'x{:g}'.format(speed)))
+        self.replayer.start(self.client, source, speed, remap)
+
+    def stop_replay(self):
+        self.replayer.stop()
+
+    def replay_status(self, stats):
+        status = 'отправлено {}, {:.0f} сообщ./с'.format(stats.sent, stats.rate)
+        if self.replay_speed:
+            status += ', опоздание: среднее {:.1f} мс, макс. {:.1f} мс'.format(
+                stats.lag_mean * 1000, stats.lag_max * 1000)
+        return status
+
+    def on_replay_progress(self, stats):
+        self.main_window.statusbar.showMessage('Воспроизведение: ' + self.replay_status(stats), 2000)
+
+    def on_replay_finished(self, stats, error):
+        status = 'Воспроизведение {}: {} за {:.1f} с'.format(
+            'прервано ({})'.format(error) if error else 'завершено', self.replay_status(stats), stats.elapsed)
+        self.log.info(status)
+        self.main_window.statusbar.showMessage(status, 10000)
+
+    def set_time_milliseconds(self, enabled):
+        self.message_model.set_time_milliseconds(enabled)
+        column = [c[0] for c in self.message_model.table_header].index('time')
+        self.messageTable.resizeColumnToContents(column)
 
     def select_last_row(self):
         self.messageTable.selectRow(self.filter_model.rowCount() - 1)
 
     def invalidate_filter(self):
-        self.filter_model.invalidateFilter()
+        self.refilter(self.filter_model.topics_changed)
+
+    # Пересчёт фильтра сбрасывает прокси-модель, выделенное сообщение восстанавливается по seq
+    def refilter(self, apply):
+        selected = self.selected_seq()
+        apply()
+        if self.filter_model.filtering:
+            self.pending_selection = selected
+        else:
+            self.restore_selection(selected)
+
+    def restore_selection(self, seq):
+        if seq is not None:
+            pos = self.filter_model.row_of_seq(seq)
+            if pos >= 0:
+                self.messageTable.selectRow(pos)
+                if not self.autoscroll:
+                    self.messageTable.scrollTo(self.filter_model.index(pos, 0))
+        if self.autoscroll:
+            self.messageTable.scrollToBottom()
+
+    def selected_seq(self):
+        indexes = self.messageTable.selectionModel().selectedIndexes()
+        if not indexes:
+            return None
+        return self.filter_model.seq_at(indexes[0].row())
+
+    def on_filter_progress(self, done, total):
+        if total:
+            self.main_window.statusbar.showMessage('Фильтрация: {}%'.format(done * 100 // total), 1000)
         if self.autoscroll:
             self.messageTable.scrollToBottom()
 
+    def on_filter_finished(self):
+        self.main_window.statusbar.showMessage(
+            'Фильтрация завершена, найдено: {}'.format(self.filter_model.rowCount()), 3000)
+        self.restore_selection(self.pending_selection)
+        self.pending_selection = None
+
     def connected(self):
         self.log.info('Connected')
         self.connInfoWrapper.setHidden(True)
@@ -326,6 +712,7 @@ class ConnectionTab(QWidget):
 
     def disconnected(self, reason=None):
         self.log.info('Disconnected')
+        self.replayer.stop()
         self.connInfoLabel.setText("")
         self.connInfoWrapper.setHidden(False)
         for widget in self.disable_when_no_conn:
@@ -336,6 +723,7 @@ class ConnectionTab(QWidget):
             self.main_window.statusbar.showMessage(reason, 5000)
             self.connInfoLabel.setText(reason)
         self.client = None
+        self.schedule_refresh()
 
     def closeEvent(self, event=None):
         self.destroy()
@@ -343,10 +731,22 @@ class ConnectionTab(QWidget):
             self.main_window.close_popped_out_conn(self)
 
     def destroy(self):
+        if self.capture_path is not None:
+            self.capture_loader.cancel()
+        if self.disk_loader is not None:
+            self.disk_loader.cancel()
+        self.exporter.cancel()
+        self.exporter.pool.waitForDone()
+        self.replayer.stop()
+        self.replayer.pool.waitForDone()
+        self.close_search_session()
+        self.filter_model.engine.cancel()
         try:
             if self.client:
-                self.client.disconnect()
+                self.client.close()
                 self.client = None
-            self.message_model.clear()
+            if self.ingress is not None:
+                self.ingress.close()
+            self.message_model.close()
         except Exception:
             pass
@@ -0,0 +1,517 @@
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .capture import MAGIC, RECORD, EXTENSION, CaptureFormatError
+from .message import Message
+from .message_store import QOS_MASK, RETAIN_FLAG, message_flags
+
+# Строка индекса: смещение записи в файле данных, время, id топика, полная длина записи
+INDEX_ENTRY = struct.Struct('<QdII')
+INDEX_EXTENSION = '.vqidx'
+TOPICS_EXTENSION = '.vqtopics'
+TOPIC_LENGTH = struct.Struct('<H')
+
+
+class Segment:
+    # Пара файлов: данные в формате записи (.vqcap, закрытый сегмент — обычный файл записи)
+    # и индекс из строк фиксированной ширины (.vqidx). Оба отображаются в память (mmap):
+    # открытый сегмент заранее растянут до полного размера и пишется прямо в отображение,
+    # закрытый обрезается по данным и открывается только для чтения. Индекс открытого сегмента
+    # сначала рассчитан на записи по index_record_size байт и удваивается, когда кончается.
+    index_record_size = 1024
+
+    def __init__(self, data_path, index_path, first_seq):
+        self.data_path = data_path
+        self.index_path = index_path
+        self.first_seq = first_seq
+        self.count = 0
+        self.data_end = len(MAGIC)
+        self.data = None
+        self.index = None
+        self.writable = False
+
+    @classmethod
+    def create(cls, data_path, index_path, first_seq, size):
+        segment = cls(data_path, index_path, first_seq)
+        with open(data_path, 'wb') as file:
+            file.write(MAGIC)
+            file.truncate(size)
+        with open(index_path, 'wb') as file:
+            file.truncate(max(size // cls.index_record_size, 1) * INDEX_ENTRY.size)
+        segment.map(mmap.ACCESS_WRITE)
+        segment.writable = True
+        return segment
+
+    # Открыть уже записанный сегмент; число строк — до первой пустой строки индекса
+    @classmethod
+    def open(cls, data_path, index_path, first_seq):
+        segment = cls(data_path, index_path, first_seq)
+        segment.map(mmap.ACCESS_READ)
+        if segment.index is not None:
+            lo, hi = 0, len(segment.index) // INDEX_ENTRY.size
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if segment.entry(mid)[3]:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            segment.count = lo
+            if lo:
+                offset, _, _, length = segment.entry(lo - 1)
+                segment.data_end = offset + length
+        return segment
+
+    def map(self, access):
+        with open(self.data_path, 'r+b' if access == mmap.ACCESS_WRITE else 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=access)
+        if os.path.getsize(self.index_path):
+            with open(self.index_path, 'r+b' if access == mmap.ACCESS_WRITE else 'rb') as file:
+                self.index = mmap.mmap(file.fileno(), 0, access=access)
+
+    def entry(self, i):
+        return INDEX_ENTRY.unpack_from(self.index, i * INDEX_ENTRY.size)
+
+    def append(self, record, timestamp, topic_id):
+        offset = self.data_end
+        if offset + len(record) > len(self.data):
+            return False
+        if (self.count + 1) * INDEX_ENTRY.size > len(self.index):
+            self.grow_index()
+        self.data[offset:offset + len(record)] = record
+        INDEX_ENTRY.pack_into(self.index, self.count * INDEX_ENTRY.size, offset, timestamp, topic_id, len(record))
+        self.data_end = offset + len(record)
+        self.count += 1
+        return True
+
+    def grow_index(self):
+        size = len(self.index) * 2
+        self.index.close()
+        with open(self.index_path, 'r+b') as file:
+            file.truncate(size)
+            self.index = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_WRITE)
+
+    @property
+    def index_size(self):
+        return len(self.index) if self.index is not None else 0
+
+    # Закончить запись: обрезать файлы по данным и переоткрыть только для чтения
+    def seal(self):
+        if not self.writable:
+            return
+        self.close()
+        with open(self.data_path, 'r+b') as file:
+            file.truncate(self.data_end)
+        with open(self.index_path, 'r+b') as file:
+            file.truncate(self.count * INDEX_ENTRY.size)
+        self.writable = False
+        self.map(mmap.ACCESS_READ)
+
+    @property
+    def end_seq(self):
+        return self.first_seq + self.count
+
+    def close(self):
+        for mapped in (self.data, self.index):
+            if mapped is not None:
+                mapped.close()
+        self.data = self.index = None
+
+    def delete(self):
+        self.close()
+        for path in (self.data_path, self.index_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class DiskStore:
+    # Хранилище с тем же интерфейсом, что MessageStore, но строки лежат на диске
+    # в каталоге вкладки: сегменты <first_seq>.vqcap + .vqidx и таблица топиков topics.bin.
+    # Строки читаются из отображённых файлов по запросу, в памяти только списки строк
+    # по топикам (для фильтра). Вытеснение освобождает диск целыми сегментами.
+    on_disk = True
+    segment_size = 256 * 1024 * 1024
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.segments = []
+        self.segment_starts = []
+        self.topics = []
+        self.topic_ids = {}
+        self.topic_bytes = []
+        self._topic_rows = None
+        self.topics_file = None  # открывается в load
+
+    # Открыть сегменты и построить списки строк по топикам; вызывается в фоне (CaptureLoader).
+    # progress(готово, всего) в строках; если он вернёт False, загрузка прерывается
+    def load(self, progress=None):
+        topics_path = os.path.join(self.directory, 'topics.bin')
+        self.load_topics(topics_path)
+        self.topics_file = open(topics_path, 'ab')
+
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(EXTENSION))
+        for name in names:
+            base = os.path.join(self.directory, name[:-len(EXTENSION)])
+            if not os.path.exists(base + INDEX_EXTENSION):
+                continue
+            segment = Segment.open(base + EXTENSION, base + INDEX_EXTENSION, int(name[:-len(EXTENSION)]))
+            if segment.count:
+                self.add_segment(segment)
+            else:
+                segment.delete()
+        self.first_seq = self.segments[0].first_seq if self.segments else 0
+        return self.index_topics(progress)
+
+    # Таблица топиков: длина (TOPIC_LENGTH) и UTF-8 подряд, id — порядковый номер
+    def load_topics(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as file:
+            data = file.read()
+        pos = 0
+        while pos + TOPIC_LENGTH.size <= len(data):
+            length, = TOPIC_LENGTH.unpack_from(data, pos)
+            pos += TOPIC_LENGTH.size
+            if pos + length > len(data):
+                break
+            self.add_topic(data[pos:pos + length].decode('utf-8', 'replace'), data[pos:pos + length])
+            pos += length
+
+    def add_topic(self, topic, encoded):
+        topic_id = len(self.topics)
+        self.topics.append(topic)
+        self.topic_ids[topic] = topic_id
+        self.topic_bytes.append(encoded)
+        return topic_id
+
+    def add_segment(self, segment):
+        self.segments.append(segment)
+        self.segment_starts.append(segment.first_seq)
+
+    def __len__(self):
+        return self.end_seq - self.first_seq
+
+    @property
+    def end_seq(self):
+        return self.segments[-1].end_seq if self.segments else self.first_seq
+
+    # Занято на диске (данные и индексы) без уже вытесненного начала первого сегмента
+    @property
+    def payload_bytes(self):
+        if not self.segments:
+            return 0
+        total = sum(segment.data_end + segment.index_size for segment in self.segments)
+        first = self.segments[0]
+        if self.first_seq >= first.end_seq:
+            total -= first.data_end + first.index_size
+        elif self.first_seq > first.first_seq:
+            evicted = self.first_seq - first.first_seq
+            total -= first.entry(evicted)[0] + evicted * INDEX_ENTRY.size
+        return total
+
+    def intern_topic(self, topic):
+        topic_id = self.topic_ids.get(topic)
+        if topic_id is None:
+            encoded = topic.encode('utf-8')
+            topic_id = self.add_topic(topic, encoded)
+            self.topics_file.write(TOPIC_LENGTH.pack(len(encoded)) + encoded)
+            self.topics_file.flush()
+        return topic_id
+
+    # Списки строк по топикам для уже записанной истории: один проход по индексам сегментов.
+    # Дальше они дополняются при записи и вытеснении
+    def index_topics(self, progress=None):
+        rows = {}
+        done, total = 0, len(self)
+        for segment in self.segments:
+            start = max(segment.first_seq, self.first_seq)
+            ids = memoryview(segment.index).cast('I')[4 + (start - segment.first_seq) * 6:segment.count * 6:6]
+            for seq, topic_id in zip(range(start, segment.end_seq), ids):
+                topic_seqs = rows.get(topic_id)
+                if topic_seqs is None:
+                    topic_seqs = rows[topic_id] = array('Q')
+                topic_seqs.append(seq)
+            ids.release()
+            done += segment.end_seq - start
+            if progress is not None and progress(done, total) is False:
+                return False
+        self._topic_rows = rows
+        return True
+
+    @property
+    def topic_rows(self):
+        if self._topic_rows is None:
+            self.index_topics()
+        return self._topic_rows
+
+    def append(self, msg):
+        self.append_record(msg.topic, msg.timestamp, message_flags(msg.qos, msg.retain),
+                           msg.mid, msg.raw_payload)
+
+    def append_record(self, topic, timestamp, flags, mid, payload):
+        topic_id = self.intern_topic(topic)
+        encoded = self.topic_bytes[topic_id]
+        record = b''.join((RECORD.pack(RECORD.size + len(encoded) + len(payload), timestamp, flags,
+                                       mid & 0xFFFF, len(encoded)), encoded, payload))
+        segment = self.segments[-1] if self.segments and self.segments[-1].writable else None
+        if segment is None or not segment.append(record, timestamp, topic_id):
+            if segment is not None:
+                segment.seal()
+            base = os.path.join(self.directory, '{:020d}'.format(self.end_seq))
+            segment = Segment.create(base + EXTENSION, base + INDEX_EXTENSION, self.end_seq,
+                                     max(self.segment_size, len(MAGIC) + len(record)))
+            self.add_segment(segment)
+            segment.append(record, timestamp, topic_id)
+        if self._topic_rows is not None:
+            topic_seqs = self._topic_rows.get(topic_id)
+            if topic_seqs is None:
+                topic_seqs = self._topic_rows[topic_id] = array('Q')
+            topic_seqs.append(segment.end_seq - 1)
+
+    def extend(self, msgs):
+        for msg in msgs:
+            self.append(msg)
+
+    def extend_records(self, records):
+        for record in records:
+            self.append_record(*record)
+
+    # Удаляет count самых старых строк; файлы удаляются, когда вытеснен весь сегмент
+    def evict(self, count):
+        count = min(count, len(self))
+        if count <= 0:
+            return
+        self.first_seq += count
+        self.drop_segments()
+        if self._topic_rows is not None:
+            for rows in self._topic_rows.values():
+                del rows[:bisect_left(rows, self.first_seq)]
+
+    def drop_segments(self):
+        while self.segments and self.segments[0].end_seq <= self.first_seq:
+            if self.segments[0].writable and len(self.segments) == 1:
+                break
+            self.segments.pop(0).delete()
+            self.segment_starts.pop(0)
+
+    # Сколько строк вытеснить, чтобы освободить nbytes: всегда до границы сегмента
+    def rows_for_bytes(self, nbytes):
+        freed = 0
+        end = self.first_seq
+        for segment in self.segments:
+            if freed >= nbytes:
+                break
+            start = max(segment.first_seq, self.first_seq) - segment.first_seq
+            freed += segment.data_end - segment.entry(start)[0] + segment.index_size - start * INDEX_ENTRY.size
+            end = segment.end_seq
+        return end - self.first_seq
+
+    def locate(self, row):
+        seq = self.first_seq + row
+        segment = self.segments[bisect_right(self.segment_starts, seq) - 1]
+        return segment, seq - segment.first_seq
+
+    def record_header(self, row):
+        segment, i = self.locate(row)
+        offset = segment.entry(i)[0]
+        return segment, offset, RECORD.unpack_from(segment.data, offset)
+
+    def seq(self, row):
+        return self.first_seq + row
+
+    def row(self, seq):
+        return seq - self.first_seq
+
+    def topic_id(self, row):
+        segment, i = self.locate(row)
+        return segment.entry(i)[2]
+
+    def topic(self, row):
+        return self.topics[self.topic_id(row)]
+
+    def timestamp(self, row):
+        segment, i = self.locate(row)
+        return segment.entry(i)[1]
+
+    def qos(self, row):
+        return self.record_header(row)[2][2] & QOS_MASK
+
+    def retain(self, row):
+        return bool(self.record_header(row)[2][2] & RETAIN_FLAG)
+
+    def mid(self, row):
+        return self.record_header(row)[2][3]
+
+    def payload_size(self, row):
+        size, _, _, _, topic_len = self.record_header(row)[2]
+        return size - RECORD.size - topic_len
+
+    def payload(self, row):
+        segment, offset, (size, _, _, _, topic_len) = self.record_header(row)
+        return segment.data[offset + RECORD.size + topic_len:offset + size]
+
+    def message(self, row):
+        segment, offset, (size, timestamp, flags, mid, topic_len) = self.record_header(row)
+        payload = segment.data[offset + RECORD.size + topic_len:offset + size]
+        return Message(self.topic(row), payload, flags & QOS_MASK, bool(flags & RETAIN_FLAG), mid, timestamp)
+
+    def clear(self):
+        for segment in self.segments:
+            segment.delete()
+        self.first_seq = self.end_seq
+        self.segments = []
+        self.segment_starts = []
+        if self._topic_rows is not None:
+            self._topic_rows = {}
+
+    # Закрыть файлы, сохранив данные на диске
+    def close(self):
+        for segment in self.segments:
+            segment.seal()
+            segment.close()
+        if self.topics_file is not None:
+            self.topics_file.close()
+
+
+class CaptureStore(DiskStore):
+    # Файл записи (.vqcap) только для чтения. При первом открытии файл один раз
+    # просматривается и строится индекс того же вида, что у сегментов DiskStore; он
+    # кэшируется рядом с файлом (<файл>.vqidx и <файл>.vqtopics), а если запись с тех пор
+    # дописывалась — индекс только продолжается. Строки читаются из mmap по запросу.
+    on_disk = True
+    progress_step = 64 * 1024 * 1024  # байт файла между вызовами progress
+    write_chunk = 1 << 20  # байт индекса за одну запись в кэш
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise CaptureFormatError('Не файл записи vqttt: {}'.format(path))
+        self.path = path
+        self.lock = threading.Lock()
+        self.segments = []
+        self.segment_starts = []
+        self.topics = []
+        self.topic_ids = {}
+        self.topic_bytes = []
+        self._topic_rows = None
+        self.first_seq = 0
+        self.segment = Segment(path, path + INDEX_EXTENSION, 0)
+        self.topics_path = path + TOPICS_EXTENSION
+
+    # Построить или дочитать индекс. progress(готово, всего) в байтах файла;
+    # если он вернёт False, индексация прерывается (построенная часть сохраняется в кэше)
+    def load(self, progress=None):
+        segment = self.segment
+        self.load_topics(self.topics_path)
+        size = os.path.getsize(self.path)
+        count = self.cached_count(size)
+        if count is None:
+            for path in (segment.index_path, self.topics_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.topics, self.topic_ids, self.topic_bytes = [], {}, []
+            count = 0
+        done = True
+        if count:
+            with open(segment.index_path, 'rb') as file:
+                file.seek((count - 1) * INDEX_ENTRY.size)
+                offset, _, _, length = INDEX_ENTRY.unpack(file.read(INDEX_ENTRY.size))
+            pos = offset + length
+        else:
+            pos = len(MAGIC)
+        if pos < size:
+            with open(self.path, 'rb') as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                done = self.scan(data, pos, size, progress)
+            finally:
+                data.close()
+        open(segment.index_path, 'ab').close()
+        segment.map(mmap.ACCESS_READ)
+        segment.count = len(segment.index) // INDEX_ENTRY.size if segment.index is not None else 0
+        if segment.count:
+            offset, _, _, length = segment.entry(segment.count - 1)
+            segment.data_end = offset + length
+            self.segments = [segment]
+            self.segment_starts = [0]
+        return done and self.index_topics(progress)
+
+    # Число строк в кэше индекса или None, если кэш не подходит к файлу
+    def cached_count(self, size):
+        index_path = self.segment.index_path
+        if not os.path.exists(index_path):
+            return 0
+        index_size = os.path.getsize(index_path)
+        count = index_size // INDEX_ENTRY.size
+        if index_size % INDEX_ENTRY.size:
+            return None
+        if not count:
+            return 0
+        with open(index_path, 'rb') as file:
+            first = INDEX_ENTRY.unpack(file.read(INDEX_ENTRY.size))
+            file.seek((count - 1) * INDEX_ENTRY.size)
+            last = INDEX_ENTRY.unpack(file.read(INDEX_ENTRY.size))
+        if first[0] != len(MAGIC) or last[0] + last[3] > size or last[2] >= len(self.topics):
+            return None
+        # Файл могли заменить другим: последняя строка кэша должна совпасть с записью в файле
+        with open(self.path, 'rb') as file:
+            file.seek(last[0])
+            length, timestamp, _, _, _ = RECORD.unpack(file.read(RECORD.size))
+        if (length, timestamp) != (last[3], last[1]):
+            return None
+        return count
+
+    def scan(self, data, pos, size, progress):
+        unpack_record = RECORD.unpack_from
+        pack_entry = INDEX_ENTRY.pack
+        ids = {encoded: topic_id for topic_id, encoded in enumerate(self.topic_bytes)}
+        entries = []
+        written = 0
+        next_progress = pos + self.progress_step
+        with open(self.segment.index_path, 'ab') as index_file, open(self.topics_path, 'ab') as topics_file:
+            while pos + RECORD.size <= size:
+                length, timestamp, _, _, topic_len = unpack_record(data, pos)
+                if length < RECORD.size + topic_len or pos + length > size:
+                    break  # недописанная последняя запись
+                encoded = data[pos + RECORD.size:pos + RECORD.size + topic_len]
+                topic_id = ids.get(encoded)
+                if topic_id is None:
+                    topic_id = ids[encoded] = self.add_topic(encoded.decode('utf-8', 'replace'), encoded)
+                    topics_file.write(TOPIC_LENGTH.pack(len(encoded)) + encoded)
+                entries.append(pack_entry(pos, timestamp, topic_id, length))
+                pos += length
+                if len(entries) * INDEX_ENTRY.size >= self.write_chunk or pos >= next_progress:
+                    # Сначала топики: строки кэша ссылаются только на уже записанные id
+                    topics_file.flush()
+                    index_file.write(b''.join(entries))
+                    written += len(entries)
+                    entries = []
+                    if pos >= next_progress:
+                        next_progress = pos + self.progress_step
+                        if progress is not None and progress(pos, size) is False:
+                            index_file.flush()
+                            return False
+            topics_file.flush()
+            index_file.write(b''.join(entries))
+        return True
+
+    def append_record(self, topic, timestamp, flags, mid, payload):
+        raise CaptureFormatError('Запись открыта только для чтения')
+
+    def drop_segments(self):
+        pass
+
+    def clear(self):
+        self.first_seq = self.end_seq
+        if self._topic_rows is not None:
+            self._topic_rows = {}
+
+    def close(self):
+        self.segment.close()
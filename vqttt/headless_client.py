@@ -0,0 +1,137 @@
+import socket
+import time
+
+import paho.mqtt.client as mqtt
+
+from .ingress_queue import IngressQueue
+from .topic_matcher import TopicMute
+
+
+def disconnect_reason(rc):
+    if rc == 1:
+        return 'Соединение закрыто'
+    elif rc == 5:
+        return 'Ошибка авторизации'
+    return ''
+
+
+class HeadlessClient:
+    # Подключение paho без Qt в собственном цикле: процесс приёма (IngestWorker) и запись
+    # на диск (Recorder). Подключение с таймаутом, подписки, заглушённые топики
+    # и политика переполнения — общие; наследники определяют deliver, event и poll.
+    loop_timeout = 0.02  # сек; как часто вызывать poll
+
+    def __init__(self, host, port, username=None, password=None, client_id=None,
+                 connect_timeout=2.0, policy=IngressQueue.DropNewest):
+        self.host, self.port = host, port
+        self.connect_timeout = connect_timeout
+        self.policy = policy
+        self.sample_counters = {}
+        self.mute = None
+        self.subscriptions = []  # (топик, qos), подписаться после подключения
+        self.running = True
+        self.connected = False
+        self.received = 0
+        self.dropped = 0
+        self.muted = 0
+
+        self.client = mqtt.Client(client_id)
+        self.client.on_message = self.on_message
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.username_pw_set(username, password)
+
+    def run(self):
+        try:
+            self.connect()
+            while self.running:
+                if self.accepting():
+                    self.client.loop(self.loop_timeout)
+                else:
+                    # Политика Block: сокет не читается, пока получатель не освободит место
+                    self.client.loop_misc()
+                    time.sleep(0.001)
+                self.poll()
+                if not self.connected and time.monotonic() > self.deadline:
+                    self.event('disconnected', 'Вышло время попытки подключения')
+                    break
+        except (EOFError, BrokenPipeError):
+            pass
+        except Exception as e:
+            self.event('disconnected', 'Ошибка подключения: {}'.format(e))
+        finally:
+            self.close()
+
+    def connect(self):
+        self.deadline = time.monotonic() + self.connect_timeout
+        sock = socket.create_connection((self.host, self.port), self.connect_timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.client.connect_async(self.host, self.port)
+        self.client._create_socket_connection = lambda: sock
+        self.client.reconnect()
+
+    def stop(self):
+        if self.connected:
+            self.client.disconnect()
+        else:
+            self.running = False
+
+    def set_muted_topics(self, muted):
+        self.mute = TopicMute(muted) if any(muted.values()) else None
+
+    def set_policy(self, policy):
+        self.policy = policy
+        self.sample_counters.clear()
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            self.connected = True
+            if self.subscriptions:
+                self.client.subscribe(self.subscriptions)
+            self.event('connected')
+
+    def on_disconnect(self, client, userdata, rc):
+        self.running = False
+        self.event('disconnected', disconnect_reason(rc))
+
+    def on_message(self, client, userdata, msg):
+        received = time.time()
+        topic = msg.topic
+        if self.mute is not None and self.mute.is_muted(topic):
+            self.count('muted')
+            return
+        self.count('received')
+        if self.policy == IngressQueue.Sample:
+            if self.fill() * 2 < 1:
+                self.sample_counters.clear()
+            else:
+                n = self.sample_counters.get(topic, 0)
+                self.sample_counters[topic] = n + 1
+                if n % IngressQueue.sample_rate:
+                    self.count('dropped')
+                    return
+        if not self.deliver(topic, received, msg):
+            self.count('dropped')
+
+    def count(self, counter):
+        setattr(self, counter, getattr(self, counter) + 1)
+
+    # Передать сообщение получателю; False — отброшено из-за переполнения
+    def deliver(self, topic, received, msg):
+        raise NotImplementedError
+
+    # Заполненность получателя от 0 до 1 (для политики Sample)
+    def fill(self):
+        return 0
+
+    def accepting(self):
+        return True
+
+    def event(self, name, *args):
+        pass
+
+    def poll(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,78 @@
+import time
+
+from .headless_client import HeadlessClient
+from .ingress_queue import IngressQueue
+from .message_store import message_flags
+from .shm_ring import ShmRingWriter, RECEIVED, DROPPED, MUTED
+
+# Процесс приёма одного подключения, без Qt. Сеть и разбор пакетов paho идут здесь,
+# сообщения пишутся записями в кольцо разделяемой памяти (ShmRing), а в GUI по conn
+# уходят только короткие события: ('connected',), ('disconnected', причина),
+# ('wakeup',) — в кольце появились данные, ('error', текст).
+# Команды из GUI: subscribe, unsubscribe, publish, mute, policy, disconnect.
+
+RING_COUNTERS = {'received': RECEIVED, 'dropped': DROPPED, 'muted': MUTED}
+
+
+def main(ring_name, host, port, username, password, client_id, conn, connect_timeout, policy):
+    IngestWorker(ring_name, host, port, username, password, client_id, conn,
+                 connect_timeout, policy).run()
+
+
+class IngestWorker(HeadlessClient):
+    def __init__(self, ring_name, host, port, username, password, client_id, conn,
+                 connect_timeout, policy):
+        super().__init__(host, port, username, password, client_id, connect_timeout, policy)
+        self.ring = ShmRingWriter(ring_name)
+        self.conn = conn
+
+    # Счётчики живут в заголовке кольца, GUI читает их оттуда
+    def count(self, counter):
+        self.ring.count(RING_COUNTERS[counter])
+
+    def fill(self):
+        return self.ring.used() / self.ring.capacity
+
+    def deliver(self, topic, received, msg):
+        ring = self.ring
+        record = (topic.encode('utf-8'), received, message_flags(msg.qos, msg.retain), msg.mid, msg.payload)
+        while not ring.write(*record):
+            # Писать старые записи может только GUI, поэтому DropOldest здесь как DropNewest
+            if self.policy != IngressQueue.Block or len(msg.payload) > ring.capacity // 2:
+                return False
+            # Block: свой процесс можно просто остановить, сокет тем временем не читается
+            time.sleep(0.001)
+            self.poll()
+            if not self.running:
+                return True
+        if ring.need_wakeup():
+            self.event('wakeup')
+        return True
+
+    def event(self, name, *args):
+        try:
+            self.conn.send((name,) + args)
+        except (EOFError, BrokenPipeError, OSError):
+            self.running = False
+
+    def poll(self):
+        while self.conn.poll():
+            command, *args = self.conn.recv()
+            try:
+                if command == 'subscribe':
+                    self.client.subscribe(*args)
+                elif command == 'unsubscribe':
+                    self.client.unsubscribe(*args)
+                elif command == 'publish':
+                    self.client.publish(*args)
+                elif command == 'mute':
+                    self.set_muted_topics(args[0])
+                elif command == 'policy':
+                    self.set_policy(args[0])
+                elif command == 'disconnect':
+                    self.stop()
+            except Exception as e:
+                self.event('error', '{}: {}'.format(command, e))
+
+    def close(self):
+        self.ring.close()
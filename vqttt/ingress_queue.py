@@ -0,0 +1,81 @@
+import threading
+from collections import deque
+
+
+class IngressQueue:
+    # Ограниченная очередь между тредом сети и GUI. Что делать, когда GUI не успевает:
+    Block = 'block'              # не читать сокет (TCP-окно закроется), пока не освободится место
+    DropNewest = 'drop_newest'   # отбрасывать пришедшие сообщения
+    DropOldest = 'drop_oldest'   # вытеснять самые старые из очереди
+    Sample = 'sample'            # при заполнении больше чем наполовину пропускать 1 из N по каждому топику
+
+    policies = (Block, DropNewest, DropOldest, Sample)
+
+    sample_rate = 10
+
+    def __init__(self, capacity=100000, policy=DropNewest):
+        self.capacity = capacity
+        self.policy = policy
+        self.items = deque()
+        self.lock = threading.Lock()
+        self.sample_counters = {}  # топик -> сколько сообщений пришло за время прореживания
+        self.received = 0
+        self.dropped = 0
+        self.muted = 0  # отброшено MqttClient до очереди по заглушённым топикам
+
+    def __len__(self):
+        return len(self.items)
+
+    # Вызывается из треда сети. True, если очередь была пуста: тогда нужно разбудить GUI,
+    # остальные сообщения он заберёт тем же take
+    def put(self, msg):
+        with self.lock:
+            self.received += 1
+            items = self.items
+            if self.policy == IngressQueue.Sample:
+                if len(items) * 2 < self.capacity:
+                    self.sample_counters.clear()
+                else:
+                    n = self.sample_counters.get(msg.topic, 0)
+                    self.sample_counters[msg.topic] = n + 1
+                    if n % self.sample_rate:
+                        self.dropped += 1
+                        return False
+            if len(items) >= self.capacity:
+                if self.policy == IngressQueue.DropOldest:
+                    items.popleft()
+                    self.dropped += 1
+                elif self.policy != IngressQueue.Block:
+                    self.dropped += 1
+                    return False
+            items.append(msg)
+            return len(items) == 1
+
+    # Вызывается из GUI: забрать до limit сообщений (все, если limit не задан)
+    def take(self, limit=None):
+        with self.lock:
+            items = self.items
+            if limit is None or limit >= len(items):
+                result = list(items)
+                items.clear()
+            else:
+                result = [items.popleft() for _ in range(limit)]
+            return result
+
+    def drain_into(self, model):
+        model.store_messages(self.take())
+
+    # Вкладка закрыта: непрочитанные сообщения больше не нужны
+    def close(self):
+        with self.lock:
+            self.items.clear()
+
+    def set_policy(self, policy):
+        with self.lock:
+            self.policy = policy
+            self.sample_counters.clear()
+
+    # Для Block: сокет не читается, пока очередь полна. Пакеты, уже прочитанные
+    # из сокета, всё равно ставятся в очередь, поэтому она может чуть превысить capacity
+    def accepting(self):
+        return self.policy != IngressQueue.Block or len(self.items) < self.capacity
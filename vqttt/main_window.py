@@ -1,9 +1,35 @@
-from qtpy.QtCore import Qt
-from qtpy.QtWidgets import (QInputDialog, QMainWindow, QMenuBar,
-                            QStatusBar, QTabWidget)
+import os
+
+from qtpy.QtCore import Qt, QTimer
+from qtpy.QtWidgets import (QFileDialog, QInputDialog, QLabel, QMainWindow, QMenuBar,
+                            QMessageBox, QStatusBar, QTabWidget)
 
 from .connection_tab import ConnectionTab
+from .ingress_queue import IngressQueue
+from .reactor import Reactor
+from .async_client import AsyncioLoop
+from .capture import EXTENSION
+from .exporter import ExportError, export_format, zstandard
+from .replay import TopicRemap, capture_source, store_source
+from .replay_dialog import ReplayDialog
 from .utils import center_widget_on_screen
+from .sizes import format_size
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+INGRESS_POLICY_NAMES = {
+    IngressQueue.Block: 'Ждать (замедлять приём из сети)',
+    IngressQueue.DropNewest: 'Отбрасывать новые сообщения',
+    IngressQueue.DropOldest: 'Отбрасывать старые сообщения',
+    IngressQueue.Sample: 'Прореживать: 1 из {} по каждому топику',
+}
+
+CLIENT_BACKEND_NAMES = {
+    'reactor': 'Общий тред (selectors)',
+    'asyncio': 'asyncio',
+    'process': 'Отдельный процесс приёма',
+}
 
 
 class MainWindow(QMainWindow):
@@ -16,10 +42,18 @@ class MainWindow(QMainWindow):
         self.server_running = False
         self.shutting_down = False
         self.conns_by_name = {}
+        self.time_milliseconds = False
+        self.refresh_rate = ConnectionTab.default_refresh_rate
+        self.global_max_bytes = 0  # общий лимит payload всех вкладок, 0 — без лимита
 
         self.setupUi()
         self.create_conn_tab()
 
+        self.memory_timer = QTimer(self)
+        self.memory_timer.setInterval(1000)
+        self.memory_timer.timeout.connect(self.check_memory)
+        self.memory_timer.start()
+
     def setupUi(self):
         self.resize(1000, 600)
         self.setWindowTitle('vqttt')
@@ -33,6 +67,9 @@ class MainWindow(QMainWindow):
 
         self.statusbar = QStatusBar(self)
         self.setStatusBar(self.statusbar)
+        self.memoryLabel = QLabel(self.statusbar)
+        self.statusbar.addPermanentWidget(self.memoryLabel)
+        self.connTabWidget.currentChanged.connect(self.update_memory_label)
 
         self.setup_menubar()
         self.setup_action_triggers()
@@ -43,6 +80,9 @@ class MainWindow(QMainWindow):
         self.setMenuBar(self.menubar)
 
         self.menuFile = self.menubar.addMenu("Меню")
+        self.actionOpenCapture = self.menuFile.addAction('Открыть запись…')
+        self.actionSetGlobalMaxBytes = self.menuFile.addAction('Общий лимит памяти')
+        self.menuFile.addSeparator()
         self.actionQuit = self.menuFile.addAction('Выйти')
 
         self.menuTab = self.menubar.addMenu("Вкладка")
@@ -52,6 +92,19 @@ class MainWindow(QMainWindow):
         self.actionPopOut = self.menuTab.addAction('Открепить')
         self.actionRenameTab = self.menuTab.addAction('Переименовать')
         self.actionSetMaxCapacity = self.menuTab.addAction('Лимит сообщений')
+        self.actionSetMaxBytes = self.menuTab.addAction('Лимит памяти')
+        self.actionDiskStore = self.menuTab.addAction('Хранить на диске…')
+        self.actionExport = self.menuTab.addAction('Экспорт…')
+        self.actionReplay = self.menuTab.addAction('Воспроизвести запись…')
+        self.actionStopReplay = self.menuTab.addAction('Остановить воспроизведение')
+        self.actionIngressPolicy = self.menuTab.addAction('При переполнении очереди приёма')
+        self.actionClientBackend = self.menuTab.addAction('Сетевой движок')
+
+        self.menuView = self.menubar.addMenu("Вид")
+        self.actionTimeMilliseconds = self.menuView.addAction('Время с миллисекундами')
+        self.actionTimeMilliseconds.setCheckable(True)
+        self.actionTimeMilliseconds.setChecked(self.time_milliseconds)
+        self.actionRefreshRate = self.menuView.addAction('Частота обновления')
 
     def setup_action_triggers(self):
         self.actionOpenTab.triggered.connect(self.create_conn_tab)
@@ -61,17 +114,43 @@ class MainWindow(QMainWindow):
         self.actionPopOut.triggered.connect(self.pop_out_tab)
         self.actionRenameTab.triggered.connect(self.rename_tab_dialog)
         self.actionSetMaxCapacity.triggered.connect(self.max_capacity_dialog)
+        self.actionSetMaxBytes.triggered.connect(self.max_bytes_dialog)
+        self.actionDiskStore.triggered.connect(self.disk_store_dialog)
+        self.actionExport.triggered.connect(self.export_dialog)
+        self.actionReplay.triggered.connect(self.replay_dialog)
+        self.actionStopReplay.triggered.connect(self.stop_replay)
+        self.actionIngressPolicy.triggered.connect(self.ingress_policy_dialog)
+        self.actionClientBackend.triggered.connect(self.client_backend_dialog)
+        self.actionOpenCapture.triggered.connect(self.open_capture_dialog)
+        self.actionOpenCapture.setShortcut('Ctrl+O')
+        self.actionSetGlobalMaxBytes.triggered.connect(self.global_max_bytes_dialog)
+        self.actionTimeMilliseconds.triggered.connect(self.set_time_milliseconds)
+        self.actionRefreshRate.triggered.connect(self.refresh_rate_dialog)
         self.actionQuit.triggered.connect(self.shutdown)
         self.actionQuit.setShortcut('Ctrl+Q')
 
     def create_conn_tab(self):
         name = self.make_conn_name_unique("Соединение")
         new_conn_tab = ConnectionTab(self.connTabWidget, self.log, name, self)
+        new_conn_tab.set_time_milliseconds(self.time_milliseconds)
+        new_conn_tab.set_refresh_rate(self.refresh_rate)
         self.conns_by_name[name] = new_conn_tab
         index = self.connTabWidget.addTab(new_conn_tab, name)
         self.connTabWidget.setCurrentIndex(index)
         return new_conn_tab, index
 
+    def open_capture_dialog(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Открыть запись', '',
+                                              'Записи vqttt (*{});;Все файлы (*)'.format(EXTENSION))
+        if path:
+            self.open_capture(path)
+
+    def open_capture(self, path):
+        tab, index = self.create_conn_tab()
+        self.rename_current_tab(os.path.basename(path))
+        tab.open_capture(path)
+        return tab
+
     def make_conn_name_unique(self, name):
         name_f = "{} {{}}".format(name)
         c = 1
@@ -130,6 +209,192 @@ class MainWindow(QMainWindow):
         tab = self.connTabWidget.widget(index)
         tab.set_max_capacity(n)
 
+    def max_bytes_dialog(self):
+        index, tab = self.get_current_conn_tab()
+        if tab.message_model.store.on_disk:
+            return self.disk_retention_dialog(tab)
+        d = QInputDialog(self)
+        d.setInputMode(QInputDialog.IntInput)
+        d.setIntRange(0, 1000000)
+        label_str = 'Установить лимит памяти (МБ) для "{}".\nСейчас {}, занято {}. Убрать лимит — 0:'
+        d.setLabelText(label_str.format(tab.name, tab.message_model.max_bytes // MB,
+                                        format_size(tab.message_model.store.payload_bytes)))
+        d.setWindowTitle('Установить лимит памяти')
+        d.intValueSelected.connect(self.set_max_bytes)
+        d.open()
+
+    def set_max_bytes(self, n):
+        index, tab = self.get_current_conn_tab()
+        tab.set_max_bytes(n * MB)
+        self.update_memory_label()
+
+    def disk_store_dialog(self):
+        index, tab = self.get_current_conn_tab()
+        directory = QFileDialog.getExistingDirectory(self, 'Каталог для сообщений "{}"'.format(tab.name),
+                                                     tab.disk_directory or '')
+        if directory:
+            tab.set_disk_store(directory)
+
+    # Для вкладки с DiskStore лимит байт — место на диске, в ГБ
+    def disk_retention_dialog(self, tab):
+        d = QInputDialog(self)
+        d.setInputMode(QInputDialog.IntInput)
+        d.setIntRange(0, 100000)
+        label_str = 'Сколько хранить на диске (ГБ) для "{}".\nСейчас {}, занято {}. Без лимита — 0:'
+        d.setLabelText(label_str.format(tab.name, tab.message_model.max_bytes // GB,
+                                        format_size(tab.message_model.store.payload_bytes)))
+        d.setWindowTitle('Установить лимит на диске')
+        d.intValueSelected.connect(lambda n: self.set_max_bytes(n * GB // MB))
+        d.open()
+
+    def export_dialog(self):
+        index, tab = self.get_current_conn_tab()
+        filters = ['NDJSON, gzip (*.ndjson.gz)', 'NDJSON (*.ndjson)', 'CSV, gzip (*.csv.gz)', 'CSV (*.csv)']
+        if zstandard is not None:
+            filters[1:1] = ['NDJSON, zstd (*.ndjson.zst)']
+            filters.append('CSV, zstd (*.csv.zst)')
+        path, selected = QFileDialog.getSaveFileName(self, 'Экспорт "{}"'.format(tab.name), tab.name,
+                                                     ';;'.join(filters))
+        if not path:
+            return
+        try:
+            export_format(path)
+        except ExportError:
+            path += selected[selected.index('*') + 1:-1]
+        visible_only = False
+        if tab.filter_model.rowCount() < tab.message_model.rowCount():
+            answer = QMessageBox.question(self, 'Экспорт', 'Экспортировать только видимые через фильтр строки?',
+                                          QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel)
+            if answer == QMessageBox.Cancel:
+                return
+            visible_only = answer == QMessageBox.Yes
+        tab.export_rows(path, visible_only)
+
+    def replay_dialog(self):
+        index, tab = self.get_current_conn_tab()
+        d = ReplayDialog(self, self.conns_by_name)
+        if not d.exec_():
+            return
+        if d.source_tab is None:
+            source = capture_source(d.path)
+        else:
+            model = self.conns_by_name[d.source_tab].message_model
+            source = store_source(model.store, range(model.store.first_seq, model.published_end_seq))
+        tab.start_replay(source, d.speed, TopicRemap(d.remap))
+
+    def stop_replay(self):
+        index, tab = self.get_current_conn_tab()
+        tab.stop_replay()
+
+    def ingress_policy_dialog(self):
+        index, tab = self.get_current_conn_tab()
+        names = [INGRESS_POLICY_NAMES[p].format(IngressQueue.sample_rate) for p in IngressQueue.policies]
+        d = QInputDialog(self)
+        d.setComboBoxItems(names)
+        d.setTextValue(names[IngressQueue.policies.index(tab.ingress_policy)])
+        d.setLabelText('Что делать, если "{}" не успевает показывать сообщения:'.format(tab.name))
+        d.setWindowTitle('Переполнение очереди приёма')
+        d.textValueSelected.connect(lambda name: self.set_ingress_policy(IngressQueue.policies[names.index(name)]))
+        d.open()
+
+    def set_ingress_policy(self, policy):
+        index, tab = self.get_current_conn_tab()
+        tab.set_ingress_policy(policy)
+
+    def client_backend_dialog(self):
+        index, tab = self.get_current_conn_tab()
+        backends = list(ConnectionTab.client_backends)
+        names = [CLIENT_BACKEND_NAMES[b] for b in backends]
+        d = QInputDialog(self)
+        d.setComboBoxItems(names)
+        d.setTextValue(names[backends.index(tab.client_backend)])
+        d.setLabelText('Сетевой движок для "{}" (действует со следующего подключения):'.format(tab.name))
+        d.setWindowTitle('Сетевой движок')
+        d.textValueSelected.connect(lambda name: self.set_client_backend(backends[names.index(name)]))
+        d.open()
+
+    def set_client_backend(self, backend):
+        index, tab = self.get_current_conn_tab()
+        tab.client_backend = backend
+
+    def global_max_bytes_dialog(self):
+        d = QInputDialog(self)
+        d.setInputMode(QInputDialog.IntInput)
+        d.setIntRange(0, 1000000)
+        label_str = 'Установить общий лимит памяти (МБ) для всех вкладок.\nСейчас {}, занято {}. Убрать лимит — 0:'
+        d.setLabelText(label_str.format(self.global_max_bytes // MB, format_size(self.total_payload_bytes())))
+        d.setWindowTitle('Установить общий лимит памяти')
+        d.intValueSelected.connect(self.set_global_max_bytes)
+        d.open()
+
+    def set_global_max_bytes(self, n):
+        self.global_max_bytes = n * MB
+        self.check_memory()
+
+    def total_payload_bytes(self):
+        return sum(conn.message_model.store.payload_bytes for conn in self.conns_by_name.values()
+                   if not conn.message_model.store.on_disk)
+
+    # Общий лимит: вытесняем самые старые сообщения среди всех вкладок
+    def check_memory(self):
+        if self.global_max_bytes:
+            excess = self.total_payload_bytes() - self.global_max_bytes
+            while excess > 0:
+                conns = [c for c in self.conns_by_name.values()
+                         if len(c.message_model.store) and not c.message_model.store.on_disk]
+                if not conns:
+                    break
+                oldest = min(conns, key=lambda c: c.message_model.store.timestamp(0))
+                model = oldest.message_model
+                before = model.store.payload_bytes
+                chunk = max(excess, int(self.global_max_bytes * model.evict_fraction))
+                model.evict_bytes(min(chunk, before))
+                excess -= before - model.store.payload_bytes
+        self.update_memory_label()
+
+    def update_memory_label(self):
+        index, tab = self.get_current_conn_tab()
+        text = ''
+        if tab is not None:
+            model = tab.message_model
+            text = 'Сообщений: {}, {}'.format(model.rowCount(), format_size(model.store.payload_bytes))
+            if model.max_bytes:
+                text += ' из {}'.format(format_size(model.max_bytes))
+            if model.store.on_disk:
+                text += ' на диске'
+            if model.oversized:
+                text += ', больше лимита: {}'.format(model.oversized)
+            if tab.ingress is not None:
+                text += '  Принято: {}, потеряно: {}, в очереди: {}'.format(
+                    tab.ingress.received, tab.ingress.dropped, len(tab.ingress))
+                if tab.ingress.muted:
+                    text += ', заглушено: {}'.format(tab.ingress.muted)
+        if len(self.conns_by_name) > 1 or self.global_max_bytes:
+            text += '  Всего: {}'.format(format_size(self.total_payload_bytes()))
+            if self.global_max_bytes:
+                text += ' из {}'.format(format_size(self.global_max_bytes))
+        self.memoryLabel.setText(text)
+
+    def set_time_milliseconds(self, enabled):
+        self.time_milliseconds = enabled
+        for conn in self.conns_by_name.values():
+            conn.set_time_milliseconds(enabled)
+
+    def refresh_rate_dialog(self):
+        d = QInputDialog(self)
+        d.setInputMode(QInputDialog.IntInput)
+        d.setIntRange(1, 120)
+        d.setIntValue(self.refresh_rate)
+        d.setLabelText('Сколько раз в секунду обновлять таблицы сообщений:')
+        d.setWindowTitle('Частота обновления')
+        d.intValueSelected.connect(self.set_refresh_rate)
+        d.open()
+
+    def set_refresh_rate(self, fps):
+        self.refresh_rate = fps
+        for conn in self.conns_by_name.values():
+            conn.set_refresh_rate(fps)
+
     def close_current_tab(self):
         index = self.connTabWidget.currentIndex()
         if index == -1:
@@ -173,6 +438,9 @@ class MainWindow(QMainWindow):
             raise SystemExit
         for conn in self.conns_by_name.values():
             conn.destroy()
+        # Отключения уже в очереди реактора (и цикла asyncio) и уйдут в сеть до его остановки
+        Reactor.shutdown()
+        AsyncioLoop.shutdown()
         self.shutting_down = True
         self.app.quit()
 
@@ -0,0 +1,39 @@
+import sys
+import time
+import binascii
+
+
+class Message:
+    # Без __dict__ и без ссылки на MQTTMessage: только то, что нужно для отображения
+    __slots__ = ('topic', 'raw_payload', 'qos', 'retain', 'mid', 'timestamp', '_payload')
+
+    def __init__(self, topic, payload, qos=0, retain=False, mid=0, timestamp=None):
+        self.topic = sys.intern(topic)
+        self.raw_payload = bytes(payload)
+        self.qos = qos
+        self.retain = bool(retain)
+        self.mid = mid
+        self.timestamp = time.time() if timestamp is None else timestamp
+        # Байты декодируются только при первом обращении к payload (отображение, поиск, детали)
+        self._payload = None
+
+    @classmethod
+    def from_mqtt(cls, msg, timestamp=None):
+        return cls(msg.topic, msg.payload, msg.qos, msg.retain, msg.mid, timestamp)
+
+    @property
+    def payload(self):
+        if self._payload is None:
+            self._payload = decode_payload(self.raw_payload)
+        return self._payload
+
+    def __repr__(self):
+        return "{}(topic={}, payload={})".format(self.__class__.__name__, self.topic, self.payload)
+
+
+# Текст, если payload — корректный UTF-8, иначе hex-дамп по 2 байта
+def decode_payload(payload):
+    try:
+        return payload.decode('utf-8')
+    except UnicodeDecodeError:
+        return binascii.hexlify(payload, ' ', -2).decode('ascii')
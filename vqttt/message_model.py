@@ -1,20 +1,64 @@
-from collections import deque
-from paho.mqtt.client import topic_matches_sub
-from qtpy.QtCore import Qt, QSortFilterProxyModel, QAbstractTableModel, QModelIndex
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from itertools import chain
+from qtpy.QtCore import Qt, Signal, QAbstractProxyModel, QAbstractTableModel, QModelIndex
 
 from .utils import get_random_color
+from .message import decode_payload
+from .message_store import MessageStore, message_flags
+from .search_index import TrigramIndex
+from .search_engine import SearchEngine
+from .search_pattern import SearchPattern
+from .topic_matcher import TopicVisibility
 
 INVALID_INDEX = QModelIndex()
 SearchRole = 256
 
 
+class TimeFormatter:
+    # Строка даты кэшируется по секундам, миллисекунды дописываются отдельно
+    cache_size = 4096
+
+    def __init__(self, milliseconds=False):
+        self.milliseconds = milliseconds
+        self.seconds_cache = {}
+
+    def format(self, timestamp):
+        second = int(timestamp)
+        result = self.seconds_cache.get(second)
+        if result is None:
+            if len(self.seconds_cache) >= self.cache_size:
+                self.seconds_cache.clear()
+            result = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+            self.seconds_cache[second] = result
+        if self.milliseconds:
+            result = '{}.{:03d}'.format(result, min(999, round((timestamp - second) * 1000)))
+        return result
+
+
 class MessageModel(QAbstractTableModel):
+    # Какая доля max_capacity освобождается за раз, когда буфер заполнен
+    evict_fraction = 0.05
+    text_cache_size = 10000
 
-    def __init__(self, parent, max_capacity=10000):
+    def __init__(self, parent, max_capacity=10000, max_bytes=0):
         super().__init__(parent)
         self.parent_widget = parent
         self.max_capacity = max_capacity
-        self.messages = deque()
+        self.max_bytes = max_bytes  # лимит суммарного размера payload, 0 — без лимита
+        self.oversized = 0  # сколько сообщений не сохранено, потому что каждое больше max_bytes
+        # На паузе показанные строки не вытесняются, а непоказанных копится не больше лимитов
+        # (max_capacity строк, max_bytes байт сверх показанного): что сверх — не сохраняется
+        self.frozen = False
+        self.frozen_bytes = 0  # payload_bytes на момент паузы
+        self.frozen_dropped = 0
+        self.store = MessageStore()
+        self.time_formatter = TimeFormatter()
+        self.text_cache = {}  # seq -> декодированный payload уже показанных строк
+        self.search_index = None  # TrigramIndex, если включён индекс поиска
+        # Сколько строк хранилища уже показано видам; остальные ждут publish
+        self.published = 0
         self.topic_colors = {}
         self.table_header = [('color', ''), ('time', 'Время'),
                              ('topic', 'Топик'), ('msg', 'Сообщение')]
@@ -23,117 +67,570 @@ class MessageModel(QAbstractTableModel):
         return len(self.table_header)
 
     def rowCount(self, index=INVALID_INDEX):
-        return len(self.messages)
+        return self.published
+
+    @property
+    def published_end_seq(self):
+        return self.store.first_seq + self.published
 
     def data(self, index, role=Qt.DisplayRole):
         if not index.isValid():
             return None
 
         result = None
-        msg = self.messages[index.row()]
+        row = index.row()
         column = self.table_header[index.column()]
 
         if role == Qt.DisplayRole:
             # print(index.row())
             column = column[0]
             if column == 'time':
-                result = msg.time
+                result = self.time_formatter.format(self.store.timestamp(row))
             elif column == 'topic':
-                result = msg.topic
+                result = self.store.topic(row)
             elif column == 'msg':
-                result = msg.payload
+                result = self.payload_text(row)
         elif role == Qt.BackgroundRole:
             if column[0] != 'color':
                 return None
-            if msg.topic in self.topic_colors:
-                return self.topic_colors[msg.topic]
+            topic_id = self.store.topic_id(row)
+            if topic_id in self.topic_colors:
+                return self.topic_colors[topic_id]
             else:
                 color = get_random_color(len(self.topic_colors))
-                self.topic_colors[msg.topic] = color
+                self.topic_colors[topic_id] = color
                 return color
         elif role == SearchRole:
-            result = msg.payload
+            result = self.payload_text(row)
         return result
 
+    def payload_text(self, row):
+        seq = self.store.seq(row)
+        text = self.text_cache.get(seq)
+        if text is None:
+            if len(self.text_cache) >= self.text_cache_size:
+                self.text_cache.clear()
+            text = decode_payload(self.store.payload(row))
+            self.text_cache[seq] = text
+        return text
+
     def headerData(self, section, orientation=Qt.Horizontal, role=Qt.DisplayRole):
         result = None
         if orientation == Qt.Horizontal and role == Qt.DisplayRole:
             result = self.table_header[section][1]
         return result
 
-    def add_message(self, msg, internal=False):
-        if not internal:
-            self.trim_if_needed()
-        row = len(self.messages)
+    def add_message(self, msg):
+        self.add_messages([msg])
+
+    # Вставка пачки с одним уведомлением о добавлении строк
+    def add_messages(self, msgs):
+        self.store_messages(msgs)
+        self.publish()
+
+    # Сохранить сообщения без уведомления видов. Лимиты применяются в publish/make_room,
+    # так что между кадрами буфер может ненадолго превысить их на размер одного кадра.
+    def store_messages(self, msgs):
+        msgs = self.fit_batch(msgs, lambda msg: len(msg.raw_payload))
+        if not msgs:
+            return
+        if self.search_index is not None:
+            seq = self.store.end_seq
+            for i, msg in enumerate(msgs):
+                self.search_index.add(seq + i, msg.raw_payload)
+        with self.store.lock:
+            self.store.extend(msgs)
+
+    # То же для записей (топик, время, флаги, mid, payload) из процесса приёма
+    def store_records(self, records):
+        records = self.fit_batch(records, lambda record: len(record[4]))
+        if not records:
+            return
+        if self.search_index is not None:
+            seq = self.store.end_seq
+            for i, record in enumerate(records):
+                self.search_index.add(seq + i, bytes(record[4]))
+        with self.store.lock:
+            self.store.extend_records(records)
+
+    # Из пачки больше лимитов всё равно останется только хвост: остальное не сохраняем
+    def fit_batch(self, items, size_of):
+        if self.max_capacity and len(items) > self.max_capacity:
+            items = items[-self.max_capacity:]
+        if self.max_bytes:
+            sizes = [size_of(item) for item in items]
+            incoming_bytes = sum(sizes)
+            skip = 0
+            while skip < len(items) and incoming_bytes > self.max_bytes:
+                incoming_bytes -= sizes[skip]
+                skip += 1
+            # Сообщение больше лимита не поместится никогда: не храним, но считаем
+            self.oversized += sum(1 for size in sizes[:skip] if size > self.max_bytes)
+            items = items[skip:]
+        if self.frozen:
+            items = self.fit_backlog(items, size_of)
+        return items
+
+    def fit_backlog(self, items, size_of):
+        room = len(items)
+        if self.max_capacity:
+            room = min(room, max(self.max_capacity - (len(self.store) - self.published), 0))
+        if self.max_bytes:
+            room_bytes = self.max_bytes - (self.store.payload_bytes - self.frozen_bytes)
+            for i in range(room):
+                room_bytes -= size_of(items[i])
+                if room_bytes < 0:
+                    room = i
+                    break
+        self.frozen_dropped += len(items) - room
+        return items[:room]
+
+    # Заморозить показанные строки (пауза) или снова разрешить вытеснение
+    def set_frozen(self, frozen):
+        self.frozen = frozen
+        self.frozen_bytes = self.store.payload_bytes
+        self.frozen_dropped = 0
 
-        self.beginInsertRows(INVALID_INDEX, row, row)
-        self.messages.append(msg)
+    # Показать видам все накопленные строки одним уведомлением; True, если что-то добавилось
+    def publish(self):
+        self.make_room()
+        total = len(self.store)
+        if total == self.published:
+            return False
+        self.beginInsertRows(INVALID_INDEX, self.published, total - 1)
+        self.published = total
         self.endInsertRows()
+        return True
 
-    # @TODO: It deletes one more row than needed because it expects an insertion next
-    def trim_if_needed(self):
-        if self.max_capacity == 0 or len(self.messages) == 0:
+    # Старые строки удаляются кусками, а не по одной на каждое новое сообщение
+    def make_room(self, incoming=0, incoming_bytes=0):
+        if self.frozen:
             return
-        diff = len(self.messages) - self.max_capacity
-        if len(self.messages) >= self.max_capacity:
-            self.beginRemoveRows(INVALID_INDEX, 0, diff)
-            while len(self.messages) >= self.max_capacity:
-                self.messages.popleft()
+        count = 0
+        if self.max_capacity:
+            overflow = len(self.store) + incoming - self.max_capacity
+            if overflow > 0:
+                count = max(overflow, int(self.max_capacity * self.evict_fraction))
+        if self.max_bytes:
+            overflow = self.store.payload_bytes + incoming_bytes - self.max_bytes
+            if overflow > 0:
+                chunk = max(overflow, int(self.max_bytes * self.evict_fraction))
+                count = max(count, self.store.rows_for_bytes(chunk))
+        self.evict(min(count, len(self.store)))
+
+    # Вытеснить старые строки, освободив не меньше nbytes байт
+    def evict_bytes(self, nbytes):
+        self.evict(self.store.rows_for_bytes(nbytes))
+
+    def evict(self, count):
+        if count <= 0:
+            return
+        removed = min(count, self.published)
+        if removed:
+            self.beginRemoveRows(INVALID_INDEX, 0, removed - 1)
+        with self.store.lock:
+            self.store.evict(count)
+        self.published -= removed
+        if self.search_index is not None:
+            self.search_index.evict(self.store.first_seq)
+        if removed:
             self.endRemoveRows()
 
+    def set_max_capacity(self, max_capacity):
+        self.max_capacity = max_capacity
+        if max_capacity and len(self.store) > max_capacity:
+            self.evict(len(self.store) - max_capacity)
+
+    def set_max_bytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        if max_bytes and self.store.payload_bytes > max_bytes:
+            self.evict_bytes(self.store.payload_bytes - max_bytes)
+
+    def set_time_milliseconds(self, enabled):
+        if self.time_formatter.milliseconds == enabled:
+            return
+        self.time_formatter.milliseconds = enabled
+        column = [c[0] for c in self.table_header].index('time')
+        if self.published:
+            self.dataChanged.emit(self.index(0, column), self.index(self.published - 1, column))
+
+    def set_search_index_enabled(self, enabled):
+        if not enabled:
+            self.search_index = None
+        elif self.search_index is None:
+            self.search_index = TrigramIndex()
+            for row in range(len(self.store)):
+                self.search_index.add(self.store.seq(row), self.store.payload(row))
+
+    # Заменить хранилище (например, на DiskStore): строки из памяти переносятся в него,
+    # а уже записанные в нём раньше сразу показываются
+    def set_store(self, store):
+        self.beginResetModel()
+        old_store = self.store
+        with old_store.lock:
+            if not old_store.on_disk:
+                store.extend_records((old_store.topic(row), old_store.timestamp(row),
+                                      message_flags(old_store.qos(row), old_store.retain(row)),
+                                      old_store.mid(row), old_store.payload(row))
+                                     for row in range(len(old_store)))
+            old_store.close()
+        self.store = store
+        self.published = len(store)
+        self.text_cache.clear()
+        self.topic_colors.clear()
+        if self.search_index is not None:
+            self.search_index = None
+            self.set_search_index_enabled(True)
+        self.endResetModel()
+
+    # Освободить хранилище; данные DiskStore остаются на диске
+    def close(self):
+        with self.store.lock:
+            self.store.close()
+        self.published = 0
+        self.text_cache.clear()
+        if self.search_index is not None:
+            self.search_index.clear()
+
     def clear(self):
-        self.messages.clear()
+        with self.store.lock:
+            self.store.clear()
+        self.published = 0
+        self.text_cache.clear()
+        if self.search_index is not None:
+            self.search_index.clear()
 
     def get_message(self, pos):
         if type(pos) is QModelIndex:
             pos = pos.row()
-        return self.messages[pos]
+        return self.store.message(pos)
+
 
+class MessageFilter(QAbstractProxyModel):
+    # Собственное отображение строк: rows — seq видимых строк источника по возрастанию.
+    # Новые строки проверяются один раз при добавлении, а при переключении видимости
+    # топика перебираются только строки этого топика (по индексу MessageStore.topic_rows).
+    # Текстовый фильтр по уже накопленным строкам считается в фоне (SearchEngine):
+    # найденное дописывается в конец rows, а пришедшие тем временем строки
+    # ждут в live_rows и присоединяются к rows по окончании.
+    # Пока ничего не скрыто, rows — range(first_seq, end_seq) без массива по 8 байт на строку;
+    # массивом он становится, когда скрытые строки появляются (materialize_rows).
+    filter_progress = Signal(int, int)
+    filter_finished = Signal()
+
+    # Больше участков при переключении топика — одна смена раскладки (change_layout)
+    max_range_updates = 64
 
-class MessageFilter(QSortFilterProxyModel):
     def __init__(self, parent, topics):
         super().__init__(parent)
         self.topics = topics
-        self.clear_filter()
-
-    def filterAcceptsRow(self, sourceRow, sourceParent):
-        msg = self.sourceModel().get_message(sourceRow)
-        result = True
-        subs = list(filter(lambda sub: topic_matches_sub(sub, msg.topic), self.topics))
-        if not subs:
-            return True
-        elif all(map(lambda s: not self.topics[s]['show'], subs)):
+        self.visibility = TopicVisibility(topics)
+        self.topic_visible = []  # id топика -> виден ли он
+        self.rows = array('Q')
+        self.live_rows = array('Q')
+        self.search_filter = False
+        self.pattern = None  # SearchPattern текстового фильтра
+
+        self.engine = SearchEngine(self)
+        self.engine.matches.connect(self.on_filter_matches)
+        self.engine.progress.connect(self.on_filter_progress)
+        self.engine.finished.connect(self.on_filter_finished)
+        self.filter_job = None
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        model.rowsInserted.connect(self.on_rows_inserted)
+        model.rowsAboutToBeRemoved.connect(self.on_rows_about_to_be_removed)
+        model.modelReset.connect(self.rebuild)
+        model.dataChanged.connect(self.on_data_changed)
+        self.rebuild()
+
+    def index(self, row, column, parent=INVALID_INDEX):
+        if parent.isValid() or not 0 <= row < self.rowCount():
+            return INVALID_INDEX
+        return self.createIndex(row, column)
+
+    def parent(self, index=INVALID_INDEX):
+        return INVALID_INDEX
+
+    def rowCount(self, parent=INVALID_INDEX):
+        if parent.isValid():
+            return 0
+        return len(self.rows) + len(self.live_rows)
+
+    def columnCount(self, parent=INVALID_INDEX):
+        return self.sourceModel().columnCount(INVALID_INDEX)
+
+    def headerData(self, section, orientation=Qt.Horizontal, role=Qt.DisplayRole):
+        return self.sourceModel().headerData(section, orientation, role)
+
+    def mapToSource(self, index):
+        if not index.isValid():
+            return INVALID_INDEX
+        model = self.sourceModel()
+        return model.index(model.store.row(self.seq_at(index.row())), index.column())
+
+    def mapFromSource(self, index):
+        if not index.isValid():
+            return INVALID_INDEX
+        pos = self.row_of_seq(self.sourceModel().store.seq(index.row()))
+        if pos < 0:
+            return INVALID_INDEX
+        return self.createIndex(pos, index.column())
+
+    def seq_at(self, row):
+        if row < len(self.rows):
+            return self.rows[row]
+        return self.live_rows[row - len(self.rows)]
+
+    # Строка прокси-модели для seq или -1, если строка скрыта
+    def row_of_seq(self, seq):
+        for offset, rows in ((0, self.rows), (len(self.rows), self.live_rows)):
+            pos = bisect_left(rows, seq)
+            if pos < len(rows) and rows[pos] == seq:
+                return offset + pos
+        return -1
+
+    # Все видимые seq по порядку строк (снимок: rows дальше меняются)
+    def visible_seqs(self):
+        if isinstance(self.rows, range):
+            return self.rows
+        return self.rows + self.live_rows
+
+    def materialize_rows(self):
+        if isinstance(self.rows, range):
+            self.rows = array('Q', self.rows)
+
+    def source_row(self, row):
+        return self.sourceModel().store.row(self.seq_at(row))
+
+    def update_topic_visibility(self):
+        topics = self.sourceModel().store.topics
+        for topic_id in range(len(self.topic_visible), len(topics)):
+            self.topic_visible.append(self.visibility.is_visible(topics[topic_id]))
+
+    def filterAcceptsRow(self, sourceRow, sourceParent=INVALID_INDEX):
+        model = self.sourceModel()
+        if not self.topic_visible[model.store.topic_id(sourceRow)]:
             return False
         if self.search_filter:
-            msg = msg.payload
-            if msg is None:
-                return False
-            regexp = self.filterRegExp()
-            if not regexp.isEmpty():
-                return regexp.exactMatch(msg)
+            return self.pattern.matches(model.payload_text(sourceRow))
+        return True
+
+    @property
+    def filtering(self):
+        return self.filter_job is not None
+
+    def on_rows_inserted(self, parent, first, last):
+        self.update_topic_visibility()
+        store = self.sourceModel().store
+        accepted = [store.seq(row) for row in range(first, last + 1) if self.filterAcceptsRow(row)]
+        if accepted:
+            pos = self.rowCount()
+            self.beginInsertRows(INVALID_INDEX, pos, pos + len(accepted) - 1)
+            rows = self.rows
+            if self.filtering:
+                self.live_rows.extend(accepted)
+            elif isinstance(rows, range) and accepted[0] == rows.stop and len(accepted) == last - first + 1:
+                self.rows = range(rows.start, accepted[-1] + 1)
             else:
-                if self.filterCaseSensitivity() == Qt.CaseInsensitive:
-                    msg = msg.lower()
-                return self.filter_string in msg
+                self.materialize_rows()
+                self.rows.extend(accepted)
+            self.endInsertRows()
+
+    # Строки убираются до того, как источник их удалит, чтобы вид не обратился к ним
+    def on_rows_about_to_be_removed(self, parent, first, last):
+        store = self.sourceModel().store
+        first_seq, end_seq = store.seq(first), store.seq(last) + 1
+        for rows in (self.rows, self.live_rows):
+            start = bisect_left(rows, first_seq)
+            end = bisect_left(rows, end_seq)
+            if start < end:
+                offset = 0 if rows is self.rows else len(self.rows)
+                self.beginRemoveRows(INVALID_INDEX, offset + start, offset + end - 1)
+                if not isinstance(rows, range):
+                    del rows[start:end]
+                elif start == 0:
+                    # Вытесняется начало: остаток — тоже непрерывный участок
+                    self.rows = rows[end:]
+                else:
+                    self.rows = array('Q', chain(rows[:start], rows[end:]))
+                self.endRemoveRows()
+
+    def on_data_changed(self, top_left, bottom_right, roles=()):
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0, top_left.column()),
+                                  self.index(self.rowCount() - 1, bottom_right.column()))
+
+    # Полный пересчёт, нужен только при смене текстового фильтра или сбросе источника
+    def rebuild(self):
+        model = self.sourceModel()
+        if model is None:
+            return
+        store = model.store
+        self.engine.cancel()
+        self.filter_job = None
+        self.topic_visible = []
+        self.update_topic_visibility()
+        candidates = self.index_candidates()
+        end_seq = model.published_end_seq
+        if candidates is not None:
+            visible = self.topic_visible
+            seqs = [seq for seq in candidates if seq < end_seq and visible[store.topic_id(store.row(seq))]]
+        elif all(self.topic_visible):
+            seqs = range(store.first_seq, end_seq)
         else:
-            return result
-        return False
+            seqs = self.topic_seqs(i for i, visible in enumerate(self.topic_visible) if visible)
 
-    def set_filter(self, string, regexp, casesensitive):
-        if regexp:
-            self.setFilterRegExp(string)
+        self.beginResetModel()
+        self.live_rows = array('Q')
+        if self.search_filter:
+            self.rows = array('Q')
+            self.filter_job = self.engine.start(store, seqs, self.pattern)
         else:
-            if not casesensitive:
-                string = string.lower()
-            self.filter_string = string
-            self.setFilterRegExp("")
+            self.rows = seqs if isinstance(seqs, range) else array('Q', seqs)
+        self.endResetModel()
+
+    def on_filter_matches(self, job_id, seqs):
+        if job_id != self.filter_job:
+            return
+        # Пока шёл поиск, часть найденных строк могла быть вытеснена
+        first_seq = self.sourceModel().store.first_seq
+        seqs = [seq for seq in seqs if seq >= first_seq]
+        if seqs:
+            pos = len(self.rows)
+            self.beginInsertRows(INVALID_INDEX, pos, pos + len(seqs) - 1)
+            self.rows.extend(seqs)
+            self.endInsertRows()
+
+    def on_filter_progress(self, job_id, done, total):
+        if job_id == self.filter_job:
+            self.filter_progress.emit(done, total)
 
+    def on_filter_finished(self, job_id):
+        if job_id != self.filter_job:
+            return
+        self.filter_job = None
+        self.rows.extend(self.live_rows)
+        self.live_rows = array('Q')
+        self.filter_finished.emit()
+
+    # Кандидаты из индекса триграмм для текущего текстового фильтра, если он применим
+    def index_candidates(self):
+        index = self.sourceModel().search_index
+        if not self.search_filter or self.pattern.literal is None or index is None:
+            return None
+        return index.candidates(self.pattern.literal, self.pattern.casesensitive)
+
+    # seq уже показанных строк этих топиков по возрастанию
+    def topic_seqs(self, topic_ids):
+        model = self.sourceModel()
+        topic_rows = model.store.topic_rows
+        seqs = sorted(chain.from_iterable(topic_rows.get(i, ()) for i in topic_ids))
+        return seqs[:bisect_left(seqs, model.published_end_seq)]
+
+    # Подписки или их флаги show изменились
+    def topics_changed(self):
+        self.visibility.invalidate()
+        old_visible = self.topic_visible
+        self.topic_visible = []
+        self.update_topic_visibility()
+        old_visible += self.topic_visible[len(old_visible):]
+        shown = [i for i, v in enumerate(self.topic_visible) if v and not old_visible[i]]
+        hidden = [i for i, v in enumerate(self.topic_visible) if not v and old_visible[i]]
+        if not shown and not hidden:
+            return
+        # Появившиеся строки нужно проверить текстовым фильтром, а идущий фоновый
+        # пересчёт мог захватить скрытые топики — в обоих случаях считаем заново
+        if self.search_filter and (shown or self.filtering):
+            self.rebuild()
+            return
+
+        # Фоновый пересчёт не идёт, значит live_rows пуст и все видимые строки в rows
+        if hidden:
+            self.remove_seqs(self.topic_seqs(hidden))
+        if shown:
+            self.insert_seqs(self.topic_seqs(shown))
+
+    # Непрерывные участки rows: [(позиция, seq участка), ...]
+    def removal_ranges(self, seqs):
+        rows = self.rows
+        ranges = []
+        pos = 0
+        for seq in seqs:
+            pos = bisect_left(rows, seq, pos)
+            if pos == len(rows):
+                break
+            if rows[pos] != seq:
+                continue
+            if ranges and ranges[-1][0] + len(ranges[-1][1]) == pos:
+                ranges[-1][1].append(seq)
+            else:
+                ranges.append((pos, [seq]))
+        return ranges
+
+    def insertion_ranges(self, seqs):
+        rows = self.rows
+        ranges = []
+        pos = 0
+        for seq in seqs:
+            pos = bisect_left(rows, seq, pos)
+            if ranges and ranges[-1][0] == pos:
+                ranges[-1][1].append(seq)
+            else:
+                ranges.append((pos, [seq]))
+        return ranges
+
+    # Скрыть строки: по участку на beginRemoveRows, с конца, чтобы позиции не сдвигались
+    def remove_seqs(self, seqs):
+        ranges = self.removal_ranges(seqs)
+        if len(ranges) > self.max_range_updates:
+            hidden = set(seqs)
+            self.change_layout(array('Q', (seq for seq in self.rows if seq not in hidden)))
+            return
+        self.materialize_rows()
+        for pos, block in reversed(ranges):
+            self.beginRemoveRows(INVALID_INDEX, pos, pos + len(block) - 1)
+            del self.rows[pos:pos + len(block)]
+            self.endRemoveRows()
+
+    # Показать строки: участки вставляются по возрастанию со сдвигом на уже вставленное
+    def insert_seqs(self, seqs):
+        ranges = self.insertion_ranges(seqs)
+        if len(ranges) > self.max_range_updates:
+            # Две отсортированные последовательности: sorted (timsort) сливает их за линейное время
+            self.change_layout(array('Q', sorted(chain(self.rows, seqs))))
+            return
+        self.materialize_rows()
+        shift = 0
+        for pos, block in ranges:
+            pos += shift
+            self.beginInsertRows(INVALID_INDEX, pos, pos + len(block) - 1)
+            self.rows[pos:pos] = array('Q', block)
+            self.endInsertRows()
+            shift += len(block)
+
+    # Много разрозненных участков (топики вперемешку): одна смена раскладки вместо тысяч
+    # уведомлений, выделение и текущая строка переносятся по seq
+    def change_layout(self, rows):
+        self.layoutAboutToBeChanged.emit()
+        old_indexes = self.persistentIndexList()
+        old_seqs = [self.seq_at(index.row()) if index.isValid() else None for index in old_indexes]
+        self.rows = rows
+        new_indexes = []
+        for index, seq in zip(old_indexes, old_seqs):
+            pos = -1 if seq is None else self.row_of_seq(seq)
+            new_indexes.append(self.createIndex(pos, index.column()) if pos >= 0 else INVALID_INDEX)
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
+    # Может выбросить re.error, если регулярное выражение некорректно
+    def set_filter(self, string, regexp, casesensitive):
+        self.pattern = SearchPattern(string, regexp, casesensitive)
         self.search_filter = True
-        self.setFilterCaseSensitivity(casesensitive)
-        self.invalidateFilter()
+        self.rebuild()
 
     def clear_filter(self):
         self.search_filter = False
-        self.filter_string = ""
-        self.setFilterRegExp("")
-        self.invalidateFilter()
+        self.pattern = None
+        self.rebuild()
@@ -0,0 +1,152 @@
+import threading
+from array import array
+from bisect import bisect_left
+
+from .message import Message
+
+QOS_MASK = 0x03
+RETAIN_FLAG = 0x04
+
+
+def message_flags(qos, retain):
+    return qos & QOS_MASK | (RETAIN_FLAG if retain else 0)
+
+
+class MessageStore:
+    # Сообщения хранятся по колонкам: id топика из таблицы интернированных топиков,
+    # время, qos|retain, mid и смещение/длина payload в общей арене байтов.
+    # Строки нумеруются сквозным номером seq, который не меняется при вытеснении старых строк.
+    on_disk = False
+
+    def __init__(self):
+        self.topics = []
+        self.topic_ids = {}
+        # Изменения из GUI-треда и чтение фоновым поиском (SearchEngine) идут под этой блокировкой
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.topic_col = array('I')
+        self.time_col = array('d')
+        self.flags_col = bytearray()
+        self.mid_col = array('H')
+        self.offset_col = array('Q')  # абсолютное смещение payload с начала записи
+        self.length_col = array('I')
+        self.arena = bytearray()
+        self.arena_start = 0  # абсолютное смещение arena[0]
+        self.first_seq = 0
+        self.topic_rows = {}  # id топика -> seq его строк по возрастанию
+
+    def close(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self.time_col)
+
+    @property
+    def end_seq(self):
+        return self.first_seq + len(self.time_col)
+
+    @property
+    def payload_bytes(self):
+        return len(self.arena)
+
+    def intern_topic(self, topic):
+        topic_id = self.topic_ids.get(topic)
+        if topic_id is None:
+            topic_id = len(self.topics)
+            self.topics.append(topic)
+            self.topic_ids[topic] = topic_id
+        return topic_id
+
+    def append(self, msg):
+        self.append_record(msg.topic, msg.timestamp, message_flags(msg.qos, msg.retain),
+                           msg.mid, msg.raw_payload)
+
+    # payload — любой буфер (bytes, memoryview); байты копируются в арену
+    def append_record(self, topic, timestamp, flags, mid, payload):
+        topic_id = self.intern_topic(topic)
+        rows = self.topic_rows.get(topic_id)
+        if rows is None:
+            rows = self.topic_rows[topic_id] = array('Q')
+        rows.append(self.end_seq)
+        self.topic_col.append(topic_id)
+        self.time_col.append(timestamp)
+        self.flags_col.append(flags)
+        self.mid_col.append(mid & 0xFFFF)
+        self.offset_col.append(self.arena_start + len(self.arena))
+        self.length_col.append(len(payload))
+        self.arena += payload
+
+    def extend(self, msgs):
+        for msg in msgs:
+            self.append(msg)
+
+    # records — кортежи (топик, время, флаги, mid, payload)
+    def extend_records(self, records):
+        for record in records:
+            self.append_record(*record)
+
+    # Удаляет count самых старых строк
+    def evict(self, count):
+        count = min(count, len(self))
+        if count <= 0:
+            return
+        for col in (self.topic_col, self.time_col, self.flags_col, self.mid_col,
+                    self.offset_col, self.length_col):
+            del col[:count]
+        self.first_seq += count
+        for rows in self.topic_rows.values():
+            del rows[:bisect_left(rows, self.first_seq)]
+        if len(self):
+            dead = self.offset_col[0] - self.arena_start
+        else:
+            dead = len(self.arena)
+        # bytearray удаляет начало без копирования хвоста
+        del self.arena[:dead]
+        self.arena_start += dead
+
+    # Сколько самых старых строк нужно вытеснить, чтобы освободить nbytes байт payload
+    def rows_for_bytes(self, nbytes):
+        freed = 0
+        count = 0
+        lengths = self.length_col
+        while freed < nbytes and count < len(lengths):
+            freed += lengths[count]
+            count += 1
+        return count
+
+    def seq(self, row):
+        return self.first_seq + row
+
+    def row(self, seq):
+        return seq - self.first_seq
+
+    def topic_id(self, row):
+        return self.topic_col[row]
+
+    def topic(self, row):
+        return self.topics[self.topic_col[row]]
+
+    def timestamp(self, row):
+        return self.time_col[row]
+
+    def qos(self, row):
+        return self.flags_col[row] & QOS_MASK
+
+    def retain(self, row):
+        return bool(self.flags_col[row] & RETAIN_FLAG)
+
+    def mid(self, row):
+        return self.mid_col[row]
+
+    def payload_size(self, row):
+        return self.length_col[row]
+
+    def payload(self, row):
+        start = self.offset_col[row] - self.arena_start
+        return bytes(self.arena[start:start + self.length_col[row]])
+
+    def message(self, row):
+        return Message(self.topic(row), self.payload(row), self.qos(row), self.retain(row),
+                       self.mid(row), self.timestamp(row))
@@ -0,0 +1,168 @@
+import multiprocessing
+import threading
+
+from qtpy.QtCore import QObject, QSocketNotifier, QTimer, Signal
+
+from . import ingest_worker
+from .client import MqttClient
+from .shm_ring import ShmRingReader
+
+
+class ProcessMqttClient(QObject):
+    # Тот же интерфейс, что у MqttClient, но сеть и разбор пакетов идут в отдельном
+    # процессе (ingest_worker). Сообщения приходят через кольцо в разделяемой памяти,
+    # которое служит очередью приёма (queue) для ConnectionTab; через канал идут
+    # только команды и короткие события.
+    Disconnected = MqttClient.Disconnected
+    Connecting = MqttClient.Connecting
+    Connected = MqttClient.Connected
+
+    messages_available = Signal()
+    connected = Signal()
+    disconnected = Signal(str)
+
+    connect_timeout = MqttClient.connect_timeout
+    ring_capacity = 64 * 1024 * 1024  # байт разделяемой памяти на подключение
+    wakeup_backstop = 200  # мс между проверками кольца на случай потерянного wakeup
+
+    def __init__(self, ip, log, port=1883, username=None, password=None, client_id=None, parent=None,
+                 queue=None):
+        super().__init__(parent)
+        self.host_ip, self.host_port = ip, port
+        self.username, self.password = username, password
+        self.client_id = client_id
+        self.state = MqttClient.Disconnected
+        self.log = log.getChild('Mqtt')
+        # Из очереди, подготовленной вкладкой, берётся только политика переполнения
+        self.policy = queue.policy if queue is not None else None
+        self.queue = ShmRingReader(capacity=self.ring_capacity)
+        self.process = None
+        self.conn = None
+        self.send_lock = threading.Lock()
+        self.notifier = None
+        self.muted = {}
+        # Флаг WAKEUP в кольце ставится и сбрасывается без барьеров памяти, поэтому wakeup
+        # изредка теряется: запись видна, а событие не пришло. Таймер забирает такие записи
+        self.backstop = QTimer(self)
+        self.backstop.setInterval(self.wakeup_backstop)
+        self.backstop.timeout.connect(self.check_ring)
+
+    def connect_to_broker(self):
+        if self.state != MqttClient.Disconnected:
+            self.log.warn("Already connected")
+            return
+        self.state = MqttClient.Connecting
+        self.log.debug("Starting ingest process for {}:{}".format(self.host_ip, self.host_port))
+        # spawn: процесс не наследует Qt и треды GUI
+        context = multiprocessing.get_context('spawn')
+        self.conn, worker_conn = context.Pipe()
+        self.process = context.Process(
+            target=ingest_worker.main, daemon=True, name='vqttt-ingest',
+            args=(self.queue.name, self.host_ip, self.host_port, self.username, self.password,
+                  self.client_id, worker_conn, self.connect_timeout, self.policy))
+        self.process.start()
+        worker_conn.close()
+        self.notifier = QSocketNotifier(self.conn.fileno(), QSocketNotifier.Read, self)
+        self.notifier.activated.connect(self.on_events)
+        self.backstop.start()
+        if any(self.muted.values()):
+            self.send('mute', self.muted)
+
+    def send(self, *command):
+        if self.conn is None:
+            return
+        try:
+            # Публиковать может и тред воспроизведения (Replayer)
+            with self.send_lock:
+                self.conn.send(command)
+        except (BrokenPipeError, OSError) as e:
+            self.log.warn("Ingest process is gone: {}".format(e))
+
+    def on_events(self):
+        try:
+            while self.conn is not None and self.conn.poll():
+                self.handle_event(*self.conn.recv())
+        except (EOFError, OSError):
+            self.finish('Процесс приёма завершился')
+
+    def handle_event(self, event, *args):
+        if event == 'wakeup':
+            self.messages_available.emit()
+        elif event == 'connected':
+            self.state = MqttClient.Connected
+            self.connected.emit()
+        elif event == 'disconnected':
+            self.finish(args[0])
+        elif event == 'error':
+            self.log.error(args[0])
+
+    def check_ring(self):
+        if len(self.queue):
+            self.messages_available.emit()
+
+    def close_conn(self):
+        self.backstop.stop()
+        self.notifier.setEnabled(False)
+        self.notifier.deleteLater()
+        self.notifier = None
+        self.conn.close()
+        self.conn = None
+
+    def finish(self, reason):
+        if self.conn is None:
+            return
+        self.close_conn()
+        self.process.join(1)
+        # Кольцо закроется, когда GUI заберёт из него последние записи
+        self.queue.producer_done = True
+        self.state = MqttClient.Disconnected
+        self.disconnected.emit(reason)
+
+    # Остановить процесс и сразу освободить разделяемую память, не дожидаясь, пока GUI
+    # заберёт последние записи: вкладка закрывается или приложение завершается
+    def close(self):
+        process = self.process
+        if process is not None and process.is_alive():
+            if self.state == MqttClient.Connected:
+                # Дать процессу отправить DISCONNECT брокеру
+                self.send('disconnect')
+                process.join(1)
+            if process.is_alive():
+                process.terminate()
+                process.join(1)
+        if self.conn is not None:
+            self.close_conn()
+        self.state = MqttClient.Disconnected
+        self.queue.close()
+
+    def disconnect(self):
+        if self.state == MqttClient.Disconnected:
+            return
+        if self.state == MqttClient.Connecting:
+            # Процесс может ждать TCP-подключения и не читать команды: его можно просто остановить
+            self.process.terminate()
+            self.finish('')
+            return
+        self.send('disconnect')
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.send('publish', topic, payload, qos, retain)
+
+    # Команды идут через канал с ограниченным буфером: при массовой публикации send сам
+    # ждёт, пока процесс приёма их разберёт
+    def publish_backlog(self):
+        return 0
+
+    def subscribe(self, topic, qos=0):
+        self.send('subscribe', topic, qos)
+
+    def unsubscribe(self, topic):
+        self.send('unsubscribe', topic)
+
+    def set_ingress_policy(self, policy):
+        self.policy = policy
+        self.send('policy', policy)
+
+    def set_muted_topics(self, muted):
+        self.muted = dict(muted)
+        self.send('mute', self.muted)
@@ -0,0 +1,255 @@
+import errno
+import logging
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+log = logging.getLogger('VQ.Reactor')
+
+
+class Reactor(threading.Thread):
+    # Один тред ввода-вывода на все подключения: сокеты paho слушает общий selector,
+    # а клиент обслуживается через loop_read/loop_write/loop_misc. Все вызовы paho
+    # выполняются только в этом треде (через call_soon/call), поэтому блокировки не нужны.
+    tick = 0.05  # сек; как часто вызывать loop_misc и проверять таймауты
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None or not cls._instance.is_alive():
+                cls._instance = cls()
+                cls._instance.start()
+            return cls._instance
+
+    @classmethod
+    def shutdown(cls, timeout=1.0):
+        with cls._instance_lock:
+            reactor, cls._instance = cls._instance, None
+        if reactor is not None:
+            reactor.stop(timeout)
+
+    def __init__(self):
+        super().__init__(name='vqttt-reactor', daemon=True)
+        self.selector = selectors.DefaultSelector()
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.wakeup_r.setblocking(False)
+        self.wakeup_w.setblocking(False)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ, None)
+        self.calls = deque()
+        self.conns = set()
+        self.running = True
+        # getaddrinfo блокирует, поэтому имена разрешаются в небольшом отдельном пуле
+        self.resolver = ThreadPoolExecutor(max_workers=2, thread_name_prefix='vqttt-resolve')
+
+    def wake(self):
+        try:
+            self.wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def call_soon(self, fn, *args):
+        self.calls.append((fn, args))
+        self.wake()
+
+    # Выполнить fn в треде реактора и дождаться результата (исключения пробрасываются)
+    def call(self, fn, *args, timeout=5.0):
+        if threading.current_thread() is self:
+            return fn(*args)
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+        self.call_soon(run)
+        return future.result(timeout)
+
+    def add(self, conn):
+        self.call_soon(self._add, conn)
+
+    def _add(self, conn):
+        self.conns.add(conn)
+        conn.start(self)
+
+    def remove(self, conn):
+        self.conns.discard(conn)
+
+    def stop(self, timeout=1.0):
+        self.call_soon(setattr, self, 'running', False)
+        if threading.current_thread() is not self:
+            self.join(timeout)
+
+    def run(self):
+        last_tick = 0
+        while self.running:
+            for key, mask in self.selector.select(self.tick):
+                if key.data is None:
+                    try:
+                        while self.wakeup_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                else:
+                    key.data.on_events(mask)
+            while self.calls:
+                fn, args = self.calls.popleft()
+                try:
+                    fn(*args)
+                except Exception as e:
+                    log.error('Ошибка в {}: {}'.format(getattr(fn, '__qualname__', fn), e), exc_info=True)
+            now = time.monotonic()
+            if now - last_tick >= self.tick:
+                last_tick = now
+                for conn in list(self.conns):
+                    conn.on_tick(now)
+            for conn in list(self.conns):
+                conn.update_interest()
+        for conn in list(self.conns):
+            conn.close()
+        self.resolver.shutdown(wait=False)
+        self.selector.close()
+        self.wakeup_r.close()
+        self.wakeup_w.close()
+
+
+class ReactorConnection:
+    # Одно подключение paho в реакторе: неблокирующий connect с таймаутом на всё
+    # (разрешение имени, TCP, CONNACK), затем готовый сокет отдаётся paho через reconnect.
+    # on_failed(reason) вызывается в треде реактора, если подключиться не удалось.
+    Resolving = 1
+    Connecting = 2
+    Handshake = 3
+    Connected = 4
+    Closed = 5
+
+    def __init__(self, client, host, port, timeout, on_failed, can_read=None):
+        self.client = client
+        self.host, self.port = host, port
+        self.timeout = timeout
+        self.on_failed = on_failed
+        self.can_read = can_read  # None или функция: False — не читать сокет (обратное давление)
+        self.reactor = None
+        self.sock = None
+        self.events = 0
+        self.deadline = 0
+        self.state = ReactorConnection.Resolving
+        client.on_socket_close = self.on_socket_close
+
+    def start(self, reactor):
+        self.reactor = reactor
+        self.deadline = time.monotonic() + self.timeout
+        future = reactor.resolver.submit(socket.getaddrinfo, self.host, self.port,
+                                         0, socket.SOCK_STREAM)
+        future.add_done_callback(lambda f: reactor.call_soon(self.on_resolved, f))
+
+    def on_resolved(self, future):
+        if self.state != ReactorConnection.Resolving:
+            return
+        try:
+            family, type_, proto, _, address = future.result()[0]
+            sock = socket.socket(family, type_, proto)
+        except Exception as e:
+            self.fail('Не удалось найти {}: {}'.format(self.host, e))
+            return
+        sock.setblocking(False)
+        # Без алгоритма Нейгла: мелкие пакеты MQTT уходят сразу, а не ждут ACK
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        err = sock.connect_ex(address)
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            sock.close()
+            self.fail('Ошибка подключения: {}'.format(errno.errorcode.get(err, err)))
+            return
+        self.sock = sock
+        self.state = ReactorConnection.Connecting
+        self.set_interest(selectors.EVENT_WRITE)
+
+    def on_connected(self):
+        err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err:
+            self.fail('Ошибка подключения: {}'.format(errno.errorcode.get(err, err)))
+            return
+        # reconnect сам отправит CONNECT; сокет уже подключён, paho его только забирает
+        sock = self.sock
+        self.client._create_socket_connection = lambda: sock
+        self.state = ReactorConnection.Handshake
+        try:
+            self.client.reconnect()
+        except Exception as e:
+            self.fail('Ошибка подключения: {}'.format(e))
+
+    def on_events(self, mask):
+        if self.state == ReactorConnection.Connecting:
+            self.on_connected()
+            return
+        if mask & selectors.EVENT_READ:
+            self.client.loop_read()
+        if mask & selectors.EVENT_WRITE and self.client.socket() is not None:
+            self.client.loop_write()
+
+    def on_tick(self, now):
+        if self.state in (ReactorConnection.Resolving, ReactorConnection.Connecting,
+                          ReactorConnection.Handshake) and now >= self.deadline:
+            self.fail('Вышло время попытки подключения')
+            return
+        if self.client.socket() is not None:
+            self.client.loop_misc()
+
+    # Вызывается из on_connect клиента, когда пришёл CONNACK
+    def established(self):
+        self.state = ReactorConnection.Connected
+
+    def update_interest(self):
+        if self.state not in (ReactorConnection.Handshake, ReactorConnection.Connected):
+            return
+        if self.client.socket() is None:
+            return
+        events = 0
+        if self.can_read is None or self.can_read():
+            events |= selectors.EVENT_READ
+        if self.client.want_write():
+            events |= selectors.EVENT_WRITE
+        self.set_interest(events)
+
+    def set_interest(self, events):
+        if events == self.events:
+            return
+        selector = self.reactor.selector
+        if not events:
+            selector.unregister(self.sock)
+        elif not self.events:
+            selector.register(self.sock, events, self)
+        else:
+            selector.modify(self.sock, events, self)
+        self.events = events
+
+    # paho закрыл сокет (отключение или ошибка): убрать его из selector
+    def on_socket_close(self, client, userdata, sock):
+        if sock is self.sock:
+            self.set_interest(0)
+            self.sock = None
+            self.state = ReactorConnection.Closed
+            self.reactor.remove(self)
+
+    def fail(self, reason):
+        self.close()
+        self.on_failed(reason)
+
+    def close(self):
+        if self.state == ReactorConnection.Closed:
+            return
+        if self.client.socket() is not None:
+            # Сокет принадлежит paho: он закроет его и вызовет on_socket_close
+            self.client._sock_close()
+        if self.sock is not None:
+            self.set_interest(0)
+            self.sock.close()
+            self.sock = None
+        self.state = ReactorConnection.Closed
+        self.reactor.remove(self)
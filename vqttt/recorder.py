@@ -0,0 +1,140 @@
+import argparse
+import logging
+import signal
+import sys
+import threading
+import time
+from collections import deque
+
+from .capture import CaptureWriter, EXTENSION
+from .headless_client import HeadlessClient
+from .ingress_queue import IngressQueue
+from .message_store import message_flags
+from .sizes import format_size
+
+
+class Recorder(HeadlessClient):
+    # Запись трафика в файл без Qt: тред сети складывает сообщения в ограниченную очередь,
+    # отдельный тред пишет их в файл пачками. Переполнение — по тем же политикам, что в GUI.
+    write_interval = 0.01  # сек; пауза треда записи, когда очередь пуста
+
+    def __init__(self, path, host, port, username=None, password=None, client_id=None,
+                 topics=(), policy=IngressQueue.DropNewest, queue_size=100000, log=None):
+        super().__init__(host, port, username, password, client_id, connect_timeout=5.0, policy=policy)
+        self.log = log or logging.getLogger('VQ.Record')
+        self.subscriptions = list(topics)
+        self.queue_size = queue_size
+        self.pending = deque()
+        self.writer = CaptureWriter(path)
+        self.writer_thread = threading.Thread(target=self.write_loop, name='vqttt-writer', daemon=True)
+        self.stop_requested = False
+        self.writing = True
+        self.started = None
+        self.error = None
+
+    def record(self, duration=None):
+        self.started = time.monotonic()
+        self.stop_at = self.started + duration if duration else None
+        self.writer_thread.start()
+        try:
+            self.run()
+        finally:
+            # Дописать всё, что уже принято, даже при принудительной остановке
+            self.writing = False
+            self.writer_thread.join()
+            self.writer.close()
+        return self.error is None
+
+    def deliver(self, topic, received, msg):
+        pending = self.pending
+        if len(pending) >= self.queue_size:
+            if self.policy == IngressQueue.DropOldest:
+                try:
+                    pending.popleft()
+                except IndexError:
+                    pass
+                self.count('dropped')
+            elif self.policy != IngressQueue.Block:
+                return False
+        pending.append((topic, received, message_flags(msg.qos, msg.retain), msg.mid, msg.payload))
+        return True
+
+    def fill(self):
+        return len(self.pending) / self.queue_size
+
+    def accepting(self):
+        return self.policy != IngressQueue.Block or len(self.pending) < self.queue_size
+
+    def write_loop(self):
+        pending = self.pending
+        while True:
+            batch = []
+            try:
+                for _ in range(len(pending)):
+                    batch.append(pending.popleft())
+            except IndexError:
+                pass
+            if batch:
+                self.writer.write_batch(batch)
+            elif not self.writing:
+                return
+            else:
+                time.sleep(self.write_interval)
+
+    def poll(self):
+        if self.stop_requested or (self.stop_at and time.monotonic() >= self.stop_at):
+            self.stop_requested = False
+            self.stop_at = None
+            self.stop()
+
+    def event(self, name, *args):
+        if name == 'connected':
+            self.log.info('Подключено к {}:{}, запись в {}'.format(self.host, self.port, self.writer.path))
+        elif name == 'disconnected' and args[0]:
+            self.error = args[0]
+            self.log.error(args[0])
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        writer = self.writer
+        return ('Записано {} сообщений, {} за {:.1f} с ({:.0f} сообщ./с, {}/с). '
+                'Принято: {}, потеряно: {}, заглушено: {}').format(
+            writer.records, format_size(writer.size), elapsed, writer.records / elapsed,
+            format_size(writer.size / elapsed), self.received, self.dropped, self.muted)
+
+
+def main(argv, log):
+    parser = argparse.ArgumentParser(prog='vqttt record', description='Запись MQTT-трафика в файл без GUI')
+    parser.add_argument('host')
+    parser.add_argument('-p', '--port', type=int, default=1883)
+    parser.add_argument('-u', '--username')
+    parser.add_argument('-P', '--password')
+    parser.add_argument('-i', '--client-id')
+    parser.add_argument('-t', '--topic', action='append', default=[],
+                        help='подписка (можно несколько раз), по умолчанию #')
+    parser.add_argument('-q', '--qos', type=int, default=0, choices=(0, 1, 2))
+    parser.add_argument('-o', '--output', help='файл записи, по умолчанию <host>-<время>' + EXTENSION)
+    parser.add_argument('-d', '--duration', type=float, help='остановиться через столько секунд')
+    parser.add_argument('--policy', choices=IngressQueue.policies, default=IngressQueue.DropNewest,
+                        help='что делать, если диск не успевает')
+    parser.add_argument('--queue', type=int, default=100000, help='размер очереди записи, сообщений')
+    args = parser.parse_args(argv)
+
+    output = args.output or '{}-{}{}'.format(args.host, time.strftime('%Y%m%d-%H%M%S'), EXTENSION)
+    topics = [(topic, args.qos) for topic in args.topic or ['#']]
+    recorder = Recorder(output, args.host, args.port, args.username, args.password, args.client_id,
+                        topics, args.policy, args.queue, log.getChild('Record'))
+
+    def on_signal(*_):
+        if recorder.stop_requested:
+            raise KeyboardInterrupt
+        recorder.stop_requested = True
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    try:
+        ok = recorder.record(args.duration)
+    except KeyboardInterrupt:
+        ok = False
+    print(recorder.report(), file=sys.stderr)
+    return 0 if ok else 1
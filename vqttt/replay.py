@@ -0,0 +1,191 @@
+import copy
+import time
+
+from qtpy.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from .capture import iter_records
+from .message_store import QOS_MASK, RETAIN_FLAG
+
+
+class TopicRemap:
+    # Правила «старый/префикс=новый/префикс» через «;»: префикс заменяется целыми уровнями
+    # топика (a/b -> x меняет a/b и a/b/c, но не a/bc). Пустой старый префикс — добавить
+    # новый ко всем топикам. Применяется первое подошедшее правило.
+    def __init__(self, rules=''):
+        self.rules = []
+        for rule in rules.split(';'):
+            if '=' in rule:
+                old, new = (part.strip().strip('/') for part in rule.split('=', 1))
+                self.rules.append((old, new))
+        self.cache = {}
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def __call__(self, topic):
+        mapped = self.cache.get(topic)
+        if mapped is None:
+            mapped = self.cache[topic] = self.remap(topic)
+        return mapped
+
+    def remap(self, topic):
+        for old, new in self.rules:
+            if not old:
+                return new + '/' + topic if new else topic
+            if topic == old or topic.startswith(old + '/'):
+                return new + topic[len(old):]
+        return topic
+
+
+# Источники: кортежи (топик, время, флаги, mid, payload) в порядке воспроизведения
+def capture_source(path):
+    return iter_records(path)
+
+
+# Снимок номеров строк вкладки; строки читаются кусками под блокировкой хранилища
+def store_source(store, seqs, chunk_size=5000):
+    for start in range(0, len(seqs), chunk_size):
+        rows = []
+        with store.lock:
+            first_seq = store.first_seq
+            for seq in seqs[start:start + chunk_size]:
+                if seq < first_seq:
+                    continue
+                row = seq - first_seq
+                rows.append((store.topic(row), store.timestamp(row),
+                             store.qos(row) | (RETAIN_FLAG if store.retain(row) else 0),
+                             store.mid(row), store.payload(row)))
+        yield from rows
+
+
+class ReplayStats:
+    def __init__(self):
+        self.sent = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.lag_total = 0.0
+        self.lag_max = 0.0  # насколько позже своего срока ушло самое опоздавшее сообщение
+
+    # Копия для сигналов: сам объект продолжает меняться в треде воспроизведения
+    def snapshot(self):
+        return copy.copy(self)
+
+    @property
+    def rate(self):
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def lag_mean(self):
+        return self.lag_total / self.sent if self.sent else 0.0
+
+
+class ReplaySignals(QObject):
+    progress = Signal(object)  # ReplayStats
+    finished = Signal(object, str)  # ReplayStats, текст ошибки
+
+
+class ReplayJob(QRunnable):
+    def __init__(self, replayer, client, source, speed, remap):
+        super().__init__()
+        self.signals = ReplaySignals()
+        self.signals.progress.connect(replayer.progress)
+        self.signals.finished.connect(replayer.finished)
+        self.replayer = replayer
+        self.client = client
+        self.source = source
+        self.speed = speed
+        self.remap = remap
+
+    def run(self):
+        stats = ReplayStats()
+        try:
+            self.replay(stats)
+        except Exception as e:
+            # У части исключений (TimeoutError от клиента) пустой текст — это всё равно ошибка
+            self.signals.finished.emit(stats.snapshot(), str(e) or type(e).__name__)
+            return
+        self.signals.finished.emit(stats.snapshot(), 'Остановлено' if self.replayer.stopped else '')
+
+    # Срок каждого сообщения отсчитывается от начала воспроизведения, а не от предыдущего
+    # сообщения, поэтому опоздания не накапливаются даже за часы
+    def replay(self, stats):
+        replayer = self.replayer
+        publish = self.client.publish
+        remap = self.remap if self.remap else None
+        speed = self.speed
+        clock = time.perf_counter
+        first_ts = None
+        start = stats.started
+        next_report = start + replayer.report_interval
+        for topic, timestamp, flags, mid, payload in self.source:
+            if replayer.stopped:
+                break
+            if first_ts is None:
+                first_ts = timestamp
+            now = clock()
+            if speed:
+                deadline = start + max(timestamp - first_ts, 0) / speed
+                if deadline > now:
+                    self.wait_until(deadline)
+                    now = clock()
+                lag = now - deadline
+                stats.lag_total += lag
+                if lag > stats.lag_max:
+                    stats.lag_max = lag
+            elif stats.sent % replayer.backlog_check == 0:
+                self.wait_backlog()
+            publish(remap(topic) if remap else topic, payload, flags & QOS_MASK, bool(flags & RETAIN_FLAG))
+            stats.sent += 1
+            if now >= next_report:
+                stats.elapsed = now - start
+                self.signals.progress.emit(stats.snapshot())
+                next_report = now + replayer.report_interval
+        stats.elapsed = clock() - start
+
+    # Грубо спим до срока минус spin_margin, остаток дожидаемся опросом часов.
+    # sleep(0) отпускает GIL, чтобы тред сети и GUI не ждали конца опроса
+    def wait_until(self, deadline):
+        clock = time.perf_counter
+        margin = self.replayer.spin_margin
+        while True:
+            left = deadline - clock()
+            if left <= 0 or self.replayer.stopped:
+                return
+            if left > margin:
+                time.sleep(min(left - margin, self.replayer.report_interval))
+            else:
+                time.sleep(0)
+
+    # Без пауз между сообщениями не даём очереди публикаций клиента расти без предела
+    def wait_backlog(self):
+        while not self.replayer.stopped and self.client.publish_backlog() > self.replayer.max_backlog:
+            time.sleep(0.001)
+
+
+class Replayer(QObject):
+    # Повторная публикация записанного трафика через клиент вкладки в отдельном треде.
+    # speed — множитель скорости относительно записи, 0 — так быстро, как возможно
+    progress = Signal(object)
+    finished = Signal(object, str)
+
+    spin_margin = 0.002  # сек до срока, с которых вместо sleep опрашиваются часы
+    report_interval = 0.5  # сек между отчётами progress
+    backlog_check = 1000  # сообщений между проверками очереди клиента при speed=0
+    max_backlog = 10000  # пакетов в очереди клиента, после которых ждём
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.stopped = False
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+
+    @property
+    def running(self):
+        return self.pool.activeThreadCount() > 0
+
+    def start(self, client, source, speed=1.0, remap=None):
+        self.stopped = False
+        self.pool.start(ReplayJob(self, client, source, speed, remap or TopicRemap()))
+
+    def stop(self):
+        self.stopped = True
@@ -0,0 +1,85 @@
+from qtpy.QtWidgets import (QComboBox, QDialog, QDialogButtonBox, QFileDialog, QFormLayout,
+                            QHBoxLayout, QLineEdit, QMessageBox, QPushButton)
+
+from .capture import EXTENSION
+
+SPEED_MAX = 'Максимальная'
+
+
+class ReplayDialog(QDialog):
+    # Источник (файл записи или буфер вкладки), скорость и переименование топиков
+    def __init__(self, parent, tab_names):
+        super().__init__(parent)
+        self.setWindowTitle('Воспроизвести запись')
+        self.tab_names = list(tab_names)
+        self.speed = 1.0
+
+        self.sourceSelector = QComboBox(self)
+        self.sourceSelector.addItem('Файл записи')
+        for name in self.tab_names:
+            self.sourceSelector.addItem('Вкладка "{}"'.format(name))
+        self.sourceSelector.currentIndexChanged.connect(self.source_changed)
+
+        self.pathLine = QLineEdit(self)
+        self.browseButton = QPushButton('Обзор…', self)
+        self.browseButton.clicked.connect(self.browse)
+        path_layout = QHBoxLayout()
+        path_layout.addWidget(self.pathLine)
+        path_layout.addWidget(self.browseButton)
+
+        self.speedSelector = QComboBox(self)
+        self.speedSelector.setEditable(True)
+        self.speedSelector.addItems(['1', '10', '100', SPEED_MAX])
+
+        self.remapLine = QLineEdit(self)
+        self.remapLine.setPlaceholderText('старый/префикс=новый/префикс; …')
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        layout = QFormLayout(self)
+        layout.addRow('Источник:', self.sourceSelector)
+        layout.addRow('Файл:', path_layout)
+        layout.addRow('Скорость (×):', self.speedSelector)
+        layout.addRow('Топики:', self.remapLine)
+        layout.addRow(buttons)
+
+    def source_changed(self, index):
+        self.pathLine.setEnabled(index == 0)
+        self.browseButton.setEnabled(index == 0)
+
+    def browse(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Файл записи', self.pathLine.text(),
+                                              'Записи vqttt (*{});;Все файлы (*)'.format(EXTENSION))
+        if path:
+            self.pathLine.setText(path)
+
+    # Имя вкладки-источника или None, если источник — файл
+    @property
+    def source_tab(self):
+        index = self.sourceSelector.currentIndex()
+        return self.tab_names[index - 1] if index else None
+
+    @property
+    def path(self):
+        return self.pathLine.text()
+
+    @property
+    def remap(self):
+        return self.remapLine.text()
+
+    def accept(self):
+        text = self.speedSelector.currentText().strip().lower().lstrip('x×').replace(',', '.')
+        try:
+            self.speed = 0.0 if text == SPEED_MAX.lower() else float(text)
+            if self.speed < 0:
+                raise ValueError
+        except ValueError:
+            QMessageBox.warning(self, 'Воспроизвести запись',
+                                'Скорость — положительное число или «{}»'.format(SPEED_MAX))
+            return
+        if self.source_tab is None and not self.path:
+            QMessageBox.warning(self, 'Воспроизвести запись', 'Выберите файл записи')
+            return
+        super().accept()
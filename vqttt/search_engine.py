@@ -0,0 +1,82 @@
+from qtpy.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from .message import decode_payload
+
+
+class SearchJobSignals(QObject):
+    matches = Signal(int, list)
+    progress = Signal(int, int, int)
+    finished = Signal(int)
+
+
+class SearchJob(QRunnable):
+    def __init__(self, engine, job_id, store, seqs, pattern):
+        super().__init__()
+        # Сигналы задачи живут, пока жива задача: если движок удалят раньше,
+        # связи с ним разорвутся сами и отправка из потока останется безопасной
+        self.signals = SearchJobSignals()
+        self.signals.matches.connect(engine.matches)
+        self.signals.progress.connect(engine.progress)
+        self.signals.finished.connect(engine.finished)
+        self.engine = engine
+        self.job_id = job_id
+        self.store = store
+        self.seqs = seqs
+        self.pattern = pattern
+
+    def cancelled(self):
+        return self.engine.job_id != self.job_id
+
+    def run(self):
+        matches = self.pattern.matches
+        store, seqs = self.store, self.seqs
+        chunk_size = self.engine.chunk_size
+        for start in range(0, len(seqs), chunk_size):
+            if self.cancelled():
+                return
+            # Хранилище меняется в GUI-треде: под его блокировкой только копируем payload куска,
+            # а декодирование и проверка (регулярка может работать долго) идут без неё
+            with store.lock:
+                first_seq = store.first_seq
+                payloads = [(seq, store.payload(seq - first_seq))
+                            for seq in seqs[start:start + chunk_size] if seq >= first_seq]
+            found = [seq for seq, payload in payloads if matches(decode_payload(payload))]
+            if found:
+                # Пока шла проверка, часть строк могла быть вытеснена
+                with store.lock:
+                    first_seq = store.first_seq
+                found = [seq for seq in found if seq >= first_seq]
+            if found:
+                self.signals.matches.emit(self.job_id, found)
+            self.signals.progress.emit(self.job_id, min(start + chunk_size, len(seqs)), len(seqs))
+        if not self.cancelled():
+            self.signals.finished.emit(self.job_id)
+
+
+class SearchEngine(QObject):
+    # Поиск и фильтрация по снимку списка seq в пуле потоков. Результаты приходят
+    # кусками через matches, устаревшие задачи останавливаются на следующем куске.
+    matches = Signal(int, list)
+    progress = Signal(int, int, int)
+    finished = Signal(int)
+
+    chunk_size = 2000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.job_id = 0
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+
+    @property
+    def running(self):
+        return self.pool.activeThreadCount() > 0
+
+    # seqs — строки для проверки в нужном порядке; pattern — SearchPattern
+    def start(self, store, seqs, pattern):
+        self.job_id += 1
+        self.pool.start(SearchJob(self, self.job_id, store, seqs, pattern))
+        return self.job_id
+
+    def cancel(self):
+        self.job_id += 1
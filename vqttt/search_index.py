@@ -0,0 +1,83 @@
+from array import array
+from bisect import bisect_left
+
+
+class TrigramIndex:
+    # Инвертированный индекс триграмм payload: триграмма -> seq строк по возрастанию.
+    # Индекс только сужает перебор: найденные кандидаты всё равно проверяются целиком.
+    # Индексируется начало payload (max_indexed байт) с ASCII в нижнем регистре;
+    # более длинные и не-UTF-8 (показываемые как hex) payload всегда считаются кандидатами.
+    max_indexed = 256
+
+    def __init__(self):
+        self.postings = {}
+        self.unindexed = array('Q')
+
+    def add(self, seq, payload):
+        if len(payload) > self.max_indexed or not is_text(payload):
+            self.unindexed.append(seq)
+            payload = payload[:self.max_indexed]
+        data = payload.lower()
+        postings = self.postings
+        for gram in {data[i:i + 3] for i in range(len(data) - 2)}:
+            seqs = postings.get(gram)
+            if seqs is None:
+                seqs = postings[gram] = array('Q')
+            seqs.append(seq)
+
+    # Забыть строки с seq меньше first_seq
+    def evict(self, first_seq):
+        empty = []
+        for gram, seqs in self.postings.items():
+            del seqs[:bisect_left(seqs, first_seq)]
+            if not seqs:
+                empty.append(gram)
+        for gram in empty:
+            del self.postings[gram]
+        del self.unindexed[:bisect_left(self.unindexed, first_seq)]
+
+    def clear(self):
+        self.postings.clear()
+        del self.unindexed[:]
+
+    # Отсортированные seq строк, которые могут содержать needle,
+    # или None, если по такой строке поиска индекс ничего не сужает
+    def candidates(self, needle, casesensitive=False):
+        data = needle.encode('utf-8')
+        grams = set()
+        for i in range(len(data) - 2):
+            gram = data[i:i + 3]
+            # Регистр не-ASCII символов в индексе не приведён, такие триграммы
+            # годятся только для поиска с учётом регистра
+            if casesensitive or gram.isascii():
+                grams.add(gram.lower())
+        if not grams:
+            return None
+
+        postings = []
+        for gram in grams:
+            seqs = self.postings.get(gram)
+            if seqs is None:
+                postings = []
+                break
+            postings.append(seqs)
+        result = set()
+        if postings:
+            postings.sort(key=len)
+            result = set(postings[0])
+            for seqs in postings[1:]:
+                result.intersection_update(seqs)
+                if not result:
+                    break
+        result.update(self.unindexed)
+        return sorted(result)
+
+
+def is_text(payload):
+    if payload.isascii():
+        return True
+    try:
+        payload.decode('utf-8')
+    except UnicodeDecodeError:
+        return False
+    return True
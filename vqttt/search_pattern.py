@@ -0,0 +1,36 @@
+import re
+
+
+class SearchPattern:
+    # Шаблон поиска, который разбирается один раз и используется и фильтром, и поиском по F3.
+    # Совпадение ищется в любом месте текста payload (re.search), а не по всей строке.
+    # Скомпилированное выражение можно использовать из нескольких потоков.
+    def __init__(self, text, regex=False, casesensitive=False):
+        self.text = text
+        self.regex = regex
+        self.casesensitive = casesensitive
+        if regex:
+            # re.error пробрасывается вызывающему — это ошибка в выражении пользователя
+            search = re.compile(text, 0 if casesensitive else re.IGNORECASE).search
+            self.matches = lambda payload: search(payload) is not None
+        elif casesensitive:
+            self.matches = lambda payload: text in payload
+        else:
+            needle = text.lower()
+            self.matches = lambda payload: needle in payload.lower()
+
+    # Подстрока, которая обязана быть в совпадении (для индекса триграмм), или None
+    @property
+    def literal(self):
+        return None if self.regex else self.text
+
+    def __eq__(self, other):
+        return isinstance(other, SearchPattern) and \
+            (self.text, self.regex, self.casesensitive) == (other.text, other.regex, other.casesensitive)
+
+    def __hash__(self):
+        return hash((self.text, self.regex, self.casesensitive))
+
+    def __repr__(self):
+        return "{}(text={!r}, regex={}, casesensitive={})".format(
+            self.__class__.__name__, self.text, self.regex, self.casesensitive)
@@ -0,0 +1,160 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from qtpy.QtCore import QObject, Signal
+
+from .search_engine import SearchEngine
+
+
+class SearchSession(QObject):
+    # Список совпадений одного шаблона: seq видимых строк по возрастанию. Считается один раз
+    # в фоне и дальше поддерживается по мере прихода и вытеснения строк, поэтому переход
+    # к следующему/предыдущему совпадению — бинарный поиск. Пока идёт фоновый проход,
+    # совпадения среди новых строк копятся в live_hits (они все позже просмотренных).
+    # Строки, скрытые или показанные фильтром, убираются из списка и вставляются в него по seq;
+    # большие вставки и смена раскладки прокси-модели пересчитываются в фоне заново.
+    changed = Signal()
+
+    max_inline_rows = 10000  # больше вставленных строк — пересчёт в фоне вместо проверки на месте
+
+    def __init__(self, pattern, filter_model, parent=None):
+        super().__init__(parent)
+        self.pattern = pattern
+        self.filter_model = filter_model
+        self.model = filter_model.sourceModel()
+        self.hits = array('Q')
+        self.live_hits = array('Q')
+        self.job = None
+
+        self.engine = SearchEngine(self)
+        self.engine.matches.connect(self.on_matches)
+        self.engine.finished.connect(self.on_finished)
+        filter_model.rowsInserted.connect(self.on_rows_inserted)
+        filter_model.rowsAboutToBeRemoved.connect(self.on_rows_about_to_be_removed)
+        filter_model.layoutChanged.connect(self.restart)
+        filter_model.modelReset.connect(self.restart)
+        filter_model.filter_finished.connect(self.restart)
+        self.restart()
+
+    def close(self):
+        self.engine.cancel()
+        self.filter_model.rowsInserted.disconnect(self.on_rows_inserted)
+        self.filter_model.rowsAboutToBeRemoved.disconnect(self.on_rows_about_to_be_removed)
+        self.filter_model.layoutChanged.disconnect(self.restart)
+        self.filter_model.modelReset.disconnect(self.restart)
+        self.filter_model.filter_finished.disconnect(self.restart)
+
+    @property
+    def scanning(self):
+        return self.job is not None or self.filter_model.filtering
+
+    @property
+    def count(self):
+        return len(self.hits) + len(self.live_hits)
+
+    def hit(self, i):
+        if i < len(self.hits):
+            return self.hits[i]
+        return self.live_hits[i - len(self.hits)]
+
+    def restart(self):
+        self.hits = array('Q')
+        self.live_hits = array('Q')
+        self.job = None
+        # Пока фильтр пересчитывается, видимые строки неизвестны — дождёмся filter_finished
+        if not self.filter_model.filtering:
+            self.job = self.engine.start(self.model.store, self.scan_seqs(), self.pattern)
+        self.changed.emit()
+
+    # Видимые строки для фонового прохода, по возможности суженные индексом триграмм
+    def scan_seqs(self):
+        index = self.model.search_index
+        if index is not None and self.pattern.literal is not None:
+            candidates = index.candidates(self.pattern.literal, self.pattern.casesensitive)
+            if candidates is not None:
+                return [seq for seq in candidates if self.filter_model.row_of_seq(seq) >= 0]
+        return self.filter_model.visible_seqs()
+
+    def on_matches(self, job_id, seqs):
+        if job_id != self.job:
+            return
+        # Пока шла проверка, строки могли вытеснить или скрыть
+        row_of_seq = self.filter_model.row_of_seq
+        self.hits.extend(seq for seq in seqs if row_of_seq(seq) >= 0)
+        self.changed.emit()
+
+    def on_finished(self, job_id):
+        if job_id != self.job:
+            return
+        self.job = None
+        self.hits.extend(self.live_hits)
+        self.live_hits = array('Q')
+        self.changed.emit()
+
+    def on_rows_inserted(self, parent, first, last):
+        if self.filter_model.filtering:
+            return
+        filter_model = self.filter_model
+        appended = last == filter_model.rowCount() - 1
+        # Показанные в середине строки могли не попасть в снимок идущего прохода
+        if last - first >= self.max_inline_rows or (self.job is not None and not appended):
+            self.restart()
+            return
+        found = []
+        for row in range(first, last + 1):
+            seq = filter_model.seq_at(row)
+            if self.pattern.matches(self.model.payload_text(self.model.store.row(seq))):
+                found.append(seq)
+        if not found:
+            return
+        hits = self.live_hits if self.job is not None else self.hits
+        if not hits or found[0] > hits[-1]:
+            hits.extend(found)
+        else:
+            # Две отсортированные последовательности: sorted сливает их за линейное время
+            self.hits = array('Q', sorted(chain(hits, found)))
+        self.changed.emit()
+
+    # Строки first..last прокси-модели идут подряд, поэтому их seq — это все видимые seq
+    # от первой до последней: совпадения между ними убираются одним срезом
+    def on_rows_about_to_be_removed(self, parent, first, last):
+        lo = self.filter_model.seq_at(first)
+        hi = self.filter_model.seq_at(last)
+        for hits in (self.hits, self.live_hits):
+            del hits[bisect_left(hits, lo):bisect_right(hits, hi)]
+        self.changed.emit()
+
+    # Номер первого совпадения после seq (None — с начала), с переносом в начало.
+    # Возвращает (номер, был ли перенос) или (None, False), если совпадений нет.
+    def next_index(self, seq):
+        if not self.count:
+            return None, False
+        if seq is None:
+            return 0, False
+        i = bisect_right(self.hits, seq)
+        if i == len(self.hits):
+            i += bisect_right(self.live_hits, seq)
+        if i < self.count:
+            return i, False
+        return 0, True
+
+    def prev_index(self, seq):
+        if not self.count:
+            return None, False
+        if seq is None:
+            return self.count - 1, False
+        i = bisect_left(self.live_hits, seq) - 1
+        if i >= 0:
+            return len(self.hits) + i, False
+        i = bisect_left(self.hits, seq) - 1
+        if i >= 0:
+            return i, False
+        return self.count - 1, True
+
+    # Номер совпадения для seq или None
+    def index_of(self, seq):
+        for offset, hits in ((0, self.hits), (len(self.hits), self.live_hits)):
+            i = bisect_left(hits, seq)
+            if i < len(hits) and hits[i] == seq:
+                return offset + i
+        return None
@@ -0,0 +1,208 @@
+import struct
+from multiprocessing import shared_memory
+from zlib import crc32
+
+# Заголовок кольца: позиции записи/чтения (растут без переполнения, смещение — по модулю
+# ёмкости), счётчики процесса-приёмника (в т.ч. число записей) и флаг "GUI уже разбужен"
+HEADER_SIZE = 64
+WRITE_POS, READ_POS, RECEIVED, DROPPED, MUTED, WRITTEN, WAKEUP = (0, 8, 16, 24, 32, 40, 48)
+U64 = struct.Struct('<Q')
+
+# Запись: полная длина, позиция записи, CRC32, время, qos|retain, mid, длина топика;
+# дальше топик и payload. CRC считается по всей записи, кроме байт самого CRC.
+RECORD = struct.Struct('<IQIdBHH')
+CRC = struct.Struct('<I')
+CRC_START, CRC_END = 12, 16
+# Переход на начало кольца: PADDING и позиция; если до конца меньше STAMP.size байт — без метки
+PADDING = 0xFFFFFFFF
+STAMP = struct.Struct('<IQ')
+
+# Барьеров памяти из Python не поставить, и на процессорах со слабым порядком (ARM) читатель
+# может увидеть новый WRITE_POS раньше байтов записи. Поэтому запись проверяет себя сама:
+# позиция в заголовке отличает её от данных прошлого круга, CRC — от недописанной.
+# Неготовую запись читатель оставляет до следующего чтения (ProcessMqttClient.backstop).
+# В обратную сторону READ_POS сдвигается только после копирования записей в хранилище,
+# а между копированием и записью позиции проходят микросекунды интерпретатора.
+
+
+def record_crc(buf, start, end):
+    return crc32(buf[start + CRC_END:end], crc32(buf[start:start + CRC_START]))
+
+# Сегменты, которые не удалось закрыть сразу (на память ещё есть memoryview):
+# имя уже удалено, отображение закрывается при следующем ShmRing.close
+unclosed = []
+
+
+def close_unclosed():
+    for shm in unclosed[:]:
+        try:
+            shm.close()
+        except BufferError:
+            continue
+        unclosed.remove(shm)
+
+
+class ShmRing:
+    # Кольцевой буфер в разделяемой памяти на одного писателя (процесс приёма)
+    # и одного читателя (GUI). Писатель двигает только WRITE_POS, читатель — только READ_POS.
+    def __init__(self, name=None, capacity=64 * 1024 * 1024):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + capacity)
+            self.shm.buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.owner = name is None
+        self.capacity = self.shm.size - HEADER_SIZE
+        self.buf = self.shm.buf
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def get(self, field):
+        return U64.unpack_from(self.buf, field)[0]
+
+    def set(self, field, value):
+        U64.pack_into(self.buf, field, value)
+
+    def used(self):
+        return self.get(WRITE_POS) - self.get(READ_POS)
+
+    def close(self):
+        if self.buf is None:
+            return
+        self.buf = None
+        if self.owner:
+            self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            unclosed.append(self.shm)
+        close_unclosed()
+
+
+class ShmRingWriter(ShmRing):
+    def write(self, topic, timestamp, flags, mid, payload):
+        size = RECORD.size + len(topic) + len(payload)
+        pos = self.get(WRITE_POS)
+        offset = pos % self.capacity
+        tail = self.capacity - offset
+        # Запись не разрывается: если не помещается до конца кольца, начинаем сначала
+        needed = size + (tail if tail < size else 0)
+        if size > self.capacity // 2 or self.capacity - (pos - self.get(READ_POS)) < needed:
+            return False
+        buf = self.buf
+        if tail < size:
+            if tail >= STAMP.size:
+                STAMP.pack_into(buf, HEADER_SIZE + offset, PADDING, pos)
+            pos += tail
+            offset = 0
+        start = HEADER_SIZE + offset
+        RECORD.pack_into(buf, start, size, pos, 0, timestamp, flags, mid, len(topic))
+        topic_start = start + RECORD.size
+        buf[topic_start:topic_start + len(topic)] = topic
+        payload_start = topic_start + len(topic)
+        buf[payload_start:payload_start + len(payload)] = payload
+        CRC.pack_into(buf, start + CRC_START, record_crc(buf, start, start + size))
+        # Позиция записи обновляется последней: до этого читатель запись не видит
+        self.set(WRITE_POS, pos + size)
+        self.count(WRITTEN)
+        return True
+
+    # True, если GUI нужно разбудить (он ещё не знает о новых данных). Без барьеров памяти
+    # флаг может разойтись с WRITE_POS, и wakeup потеряется: GUI подстраховывается таймером
+    def need_wakeup(self):
+        if self.buf[WAKEUP]:
+            return False
+        self.buf[WAKEUP] = 1
+        return True
+
+    def count(self, field, n=1):
+        self.set(field, self.get(field) + n)
+
+
+class ShmRingReader(ShmRing):
+    # Для ConnectionTab ведёт себя как очередь приёма: счётчики, len и drain_into
+    def __init__(self, name=None, capacity=64 * 1024 * 1024):
+        super().__init__(name, capacity)
+        self.topics = {}  # байты топика -> интернированная строка
+        self.producer_done = False
+        self.final_counters = None
+        self.taken = 0  # сколько записей уже забрано в модель
+
+    @property
+    def received(self):
+        return self.final_counters[0] if self.buf is None else self.get(RECEIVED)
+
+    @property
+    def dropped(self):
+        return self.final_counters[1] if self.buf is None else self.get(DROPPED)
+
+    @property
+    def muted(self):
+        return self.final_counters[2] if self.buf is None else self.get(MUTED)
+
+    def __len__(self):
+        return 0 if self.buf is None else self.get(WRITTEN) - self.taken
+
+    # Записи (топик, время, флаги, mid, payload) до текущей позиции записи (или до первой
+    # ещё не готовой) и позиция для release. payload — memoryview на разделяемую память,
+    # действителен до release; drain_into отпускает их сам
+    def read(self):
+        # Сначала сбросить флаг: запись, пришедшая во время чтения, разбудит GUI снова
+        self.buf[WAKEUP] = 0
+        buf, capacity, topics = self.buf, self.capacity, self.topics
+        pos = self.get(READ_POS)
+        end = self.get(WRITE_POS)
+        records = []
+        while pos < end:
+            offset = pos % capacity
+            tail = capacity - offset
+            start = HEADER_SIZE + offset
+            if tail < STAMP.size:
+                pos += tail
+                continue
+            size, stamp = STAMP.unpack_from(buf, start)
+            if stamp != pos:
+                break  # запись ещё не видна
+            if size == PADDING:
+                pos += tail
+                continue
+            if not RECORD.size <= size <= tail:
+                break
+            _, _, crc, timestamp, flags, mid, topic_len = RECORD.unpack_from(buf, start)
+            if RECORD.size + topic_len > size or record_crc(buf, start, start + size) != crc:
+                break  # видна не целиком
+            start += RECORD.size
+            topic_bytes = bytes(buf[start:start + topic_len])
+            topic = topics.get(topic_bytes)
+            if topic is None:
+                topic = topics[topic_bytes] = topic_bytes.decode('utf-8', 'replace')
+            start += topic_len
+            records.append((topic, timestamp, flags, mid, buf[start:start + size - RECORD.size - topic_len]))
+            pos += size
+        return records, pos
+
+    def release(self, pos):
+        self.set(READ_POS, pos)
+
+    def drain_into(self, model):
+        if self.buf is None:
+            return
+        records, pos = self.read()
+        self.taken += len(records)
+        try:
+            # Хранилище копирует payload к себе (один раз), ссылок на кольцо не остаётся
+            model.store_records(records)
+        finally:
+            for record in records:
+                record[4].release()
+        del records
+        self.release(pos)
+        if self.producer_done:
+            self.close()
+
+    def close(self):
+        if self.buf is not None:
+            self.final_counters = (self.received, self.dropped, self.muted)
+        super().close()
@@ -0,0 +1,6 @@
+def format_size(nbytes):
+    for unit in ('Б', 'КБ', 'МБ'):
+        if nbytes < 1024:
+            return '{:.0f} {}'.format(nbytes, unit) if unit == 'Б' else '{:.1f} {}'.format(nbytes, unit)
+        nbytes /= 1024
+    return '{:.1f} ГБ'.format(nbytes)
@@ -0,0 +1,86 @@
+class TrieNode:
+    __slots__ = ('children', 'subs', 'hash_subs')
+
+    def __init__(self):
+        self.children = {}
+        self.subs = []       # подписки, заканчивающиеся на этом уровне
+        self.hash_subs = []  # подписки вида "<путь до узла>/#"
+
+
+class TopicTrie:
+    # Дерево подписок по уровням топика, '+' и '#' — обычные ключи уровней.
+    # Правила совпадают с paho topic_matches_sub, включая топики на '$'.
+    def __init__(self, subs=()):
+        self.root = TrieNode()
+        for sub in subs:
+            self.insert(sub)
+
+    def insert(self, sub):
+        node = self.root
+        for level in sub.split('/'):
+            if level == '#':
+                node.hash_subs.append(sub)
+                return
+            node = node.children.setdefault(level, TrieNode())
+        node.subs.append(sub)
+
+    def match(self, topic):
+        levels = topic.split('/')
+        result = []
+        self._match(self.root, levels, 0, topic.startswith('$'), result)
+        return result
+
+    def _match(self, node, levels, i, system, result):
+        # Подстановки первого уровня не совпадают с системными топиками ($SYS/...)
+        wildcards_allowed = not (system and i == 0)
+        if node.hash_subs and wildcards_allowed:
+            result.extend(node.hash_subs)
+        if i == len(levels):
+            result.extend(node.subs)
+            return
+        child = node.children.get(levels[i])
+        if child is not None:
+            self._match(child, levels, i + 1, system, result)
+        if wildcards_allowed:
+            child = node.children.get('+')
+            if child is not None:
+                self._match(child, levels, i + 1, system, result)
+
+
+class TopicVisibility:
+    # Топик виден, если не подходит ни под одну подписку или хотя бы одна подходящая
+    # подписка включена. Результат запоминается для каждого конкретного топика
+    # и сбрасывается только при изменении подписок или их флагов show.
+    def __init__(self, topics):
+        self.topics = topics
+        self.invalidate()
+
+    def invalidate(self):
+        self.trie = TopicTrie(self.topics)
+        self.cache = {}
+
+    def is_visible(self, topic):
+        visible = self.cache.get(topic)
+        if visible is None:
+            subs = self.trie.match(topic)
+            visible = not subs or any(self.topics[sub]['show'] for sub in subs)
+            self.cache[topic] = visible
+        return visible
+
+
+class TopicMute:
+    # Снимок флагов mute подписок для треда сети: сообщение отбрасывается, если все
+    # подходящие под топик подписки заглушены. При изменении флагов снимок заменяется целиком,
+    # поэтому кэш принадлежит только треду сети и блокировки не нужны.
+    def __init__(self, muted):
+        self.muted = dict(muted)  # подписка -> заглушена ли
+        self.trie = TopicTrie(self.muted)
+        self.cache = {}
+
+    def is_muted(self, topic):
+        muted = self.cache.get(topic)
+        if muted is None:
+            subs = self.trie.match(topic)
+            muted = bool(subs) and all(self.muted[sub] for sub in subs)
+            self.cache[topic] = muted
+        return muted